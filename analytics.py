@@ -0,0 +1,141 @@
+import threading
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+from solver import DAY_START, DEFAULT_BREAKS, DEFAULT_COVERAGE, SLOT_MINUTES, SLOTS
+from store import get_store
+
+
+class CoverageIndex:
+    """Per-(date, location) coverage at 5-minute resolution, kept in step with a ShiftStore.
+
+    Each (date, location) has an int16 array with one entry per 5-minute
+    slot of the 08:00-17:00 day, counting how many shifts cover that slot,
+    so removing a shift is the exact inverse of adding it. Worked minutes
+    per (staff_id, date) are kept alongside. Both are updated as the store
+    adds and removes rows; nothing is recomputed from the shift table.
+    """
+
+    def __init__(self, store, break_locations=tuple(DEFAULT_BREAKS)):
+        self.store = store
+        self.break_locations = set(break_locations)
+        self._lock = threading.Lock()
+        store.subscribe(self)
+
+    # Store listener
+
+    def reset(self):
+        with self._lock:
+            self._coverage = {}
+            self._minutes = defaultdict(int)
+
+    def added(self, record, span):
+        self._update(record, span, 1)
+
+    def removed(self, record, span):
+        self._update(record, span, -1)
+
+    def _update(self, record, span, sign):
+        start, end = span
+        if start < 0 or end <= start:
+            return
+        date, staff_id, _, location = record
+        first = max((start - DAY_START) // SLOT_MINUTES, 0)
+        last = min(-(-(end - DAY_START) // SLOT_MINUTES), SLOTS)
+        with self._lock:
+            # A shift wholly outside 08:00-17:00 covers no slot (and a negative
+            # last would wrap the slice round to the end of the day)
+            if first < last:
+                slots = self._coverage.get((date, location))
+                if slots is None:
+                    slots = self._coverage[(date, location)] = np.zeros(SLOTS, dtype=np.int16)
+                slots[first:last] += sign
+            if location not in self.break_locations:
+                self._minutes[(staff_id, date)] += sign * (end - start)
+
+    # Queries
+
+    def covered(self, date, location):
+        """Return a bool array of the covered 5-minute slots for one date string and location."""
+        self.store.preload([date])
+        with self._lock:
+            slots = self._coverage.get((date, location))
+            return np.zeros(SLOTS, dtype=bool) if slots is None else slots > 0
+
+    def gaps(self, dates, coverage=None, weekdays=(0, 1, 2, 3, 4)):
+        """Return the uncovered stretches of each location's required window on the given dates.
+
+        coverage maps a location to a list of (start_minute, end_minute)
+        windows that need someone, as in solver.DEFAULT_COVERAGE; only dates
+        falling on weekdays are checked. Returns a DataFrame with date,
+        location, start, end and minutes columns.
+        """
+        coverage = DEFAULT_COVERAGE if coverage is None else coverage
+        dates = [date for date in dates
+                 if pd.Timestamp(date).weekday() in weekdays]
+        required = {}
+        for location, windows in coverage.items():
+            mask = np.zeros(SLOTS, dtype=bool)
+            for window_start, window_end in windows:
+                mask[(window_start - DAY_START) // SLOT_MINUTES:
+                     (window_end - DAY_START) // SLOT_MINUTES] = True
+            required[location] = mask
+
+        self.store.preload(dates)
+        keys = [(date, location) for date in dates for location in required]
+        empty = np.zeros(SLOTS, dtype=np.int16)
+        with self._lock:
+            counts = [self._coverage.get(key, empty) for key in keys]
+        missing = np.zeros((len(keys), SLOTS), dtype=bool)
+        if keys:
+            needed = np.stack([required[location] for _, location in keys])
+            missing = needed & (np.stack(counts) == 0)
+
+        # Run starts and ends from the edges of each row's missing mask
+        edges = np.diff(np.pad(missing.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+        start_rows, start_slots = np.nonzero(edges == 1)
+        _, end_slots = np.nonzero(edges == -1)
+        starts = DAY_START + start_slots * SLOT_MINUTES
+        ends = DAY_START + end_slots * SLOT_MINUTES
+        return pd.DataFrame({
+            'date': [keys[row][0] for row in start_rows],
+            'location': [keys[row][1] for row in start_rows],
+            'start': [f"{minute // 60:02d}:{minute % 60:02d}" for minute in starts],
+            'end': [f"{minute // 60:02d}:{minute % 60:02d}" for minute in ends],
+            'minutes': ends - starts,
+        }, columns=['date', 'location', 'start', 'end', 'minutes'])
+
+    def hours(self, dates):
+        """Return the hours each staff member works per ISO week on the given date strings.
+
+        Break locations are not counted. Returns a DataFrame with staff_id,
+        week (the week's Monday as a date string) and hours columns.
+        """
+        self.store.preload(dates)
+        dates = set(dates)
+        with self._lock:
+            worked = [(staff_id, date, minutes)
+                      for (staff_id, date), minutes in self._minutes.items()
+                      if date in dates and minutes]
+        worked_df = pd.DataFrame(worked, columns=['staff_id', 'date', 'minutes'])
+        days = pd.to_datetime(worked_df['date'])
+        mondays = days - pd.to_timedelta(days.dt.weekday, unit='D')
+        worked_df['week'] = mondays.dt.strftime('%Y-%m-%d')
+        hours_df = worked_df.groupby(['staff_id', 'week'], as_index=False)['minutes'].sum()
+        hours_df['hours'] = hours_df['minutes'] / 60
+        return hours_df[['staff_id', 'week', 'hours']]
+
+
+_coverage = None
+_coverage_lock = threading.Lock()
+
+
+def get_coverage():
+    """Return the CoverageIndex attached to the process-wide ShiftStore."""
+    global _coverage
+    with _coverage_lock:
+        if _coverage is None:
+            _coverage = CoverageIndex(get_store())
+        return _coverage
+
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import secrets
+import sys
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+from aiohttp import web
+
+import schedule
+import utils
+from notifications import start_notifications
+from store import get_store
+
+CACHE_SIZE = 256
+EXPORT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _error(status, message):
+    return web.json_response({'error': message}, status=status)
+
+
+def _date(value, name):
+    """Parse a YYYY-MM-DD parameter, raising a 400 response if it is missing or malformed."""
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d')
+    except ValueError:
+        raise web.HTTPBadRequest(
+            text=json.dumps({'error': f"{name} must be a YYYY-MM-DD date"}),
+            content_type='application/json'
+        )
+
+
+def _records(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+
+# Read endpoints: each returns a JSON-ready object and is cached per URL and store version
+
+def read_staff(request):
+    return _records(utils.load_staff())
+
+
+def read_shifts(request):
+    start, end = request.query.get('start'), request.query.get('end')
+    if start is None and end is None:
+        return _records(utils.load_shifts())
+    start_date = _date(start, 'start')
+    end_date = _date(end, 'end') if end else start_date
+    dates = [date.strftime('%Y-%m-%d') for date in pd.date_range(start_date, end_date)]
+    return _records(utils.load_shifts(dates))
+
+
+def read_grids(dates):
+    date_strs = [date.strftime('%Y-%m-%d') for date in dates]
+    grids = schedule.build_schedule_grids(utils.load_shifts(date_strs), utils.load_staff(),
+                                          date_strs, utils.LOCATIONS)
+    return {date: _records(grid) for date, grid in grids.items()}
+
+
+def read_daily(request):
+    return read_grids([_date(request.match_info['date'], 'date')])
+
+
+def read_weekly(request):
+    return read_grids(utils.get_week_dates(_date(request.match_info['date'], 'date')))
+
+
+def read_gaps(request):
+    start_date = _date(request.query.get('start'), 'start')
+    end_date = _date(request.query.get('end'), 'end')
+    return _records(utils.coverage_gaps(start_date, end_date))
+
+
+class ReadCache:
+    """Serialized JSON bodies keyed by URL, valid for one store version.
+
+    Each request first checks the backend's stamp, so writes from the
+    Streamlit app or other processes are picked up. Hits are then answered
+    from memory; misses run the read function in a worker thread. The ETag
+    is a random per-process token plus the store version, so clients holding
+    the current version get a 304, and a restarted server, whose versions
+    start again at 1, never matches an ETag from before the restart.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.token = secrets.token_hex(4)
+        self._bodies = {}
+
+    def etag(self, version):
+        return f'"{self.token}-{version}"'
+
+    def handler(self, read):
+        async def handle(request):
+            await asyncio.to_thread(self.store.refresh)
+            etag = self.etag(self.store.version)
+            if request.headers.get('If-None-Match') == etag:
+                return web.Response(status=304, headers={'ETag': etag})
+            key = request.path_qs
+            cached = self._bodies.get(key)
+            if cached is None or cached[0] != etag:
+                version = self.store.version
+                body = json.dumps(await asyncio.to_thread(read, request)).encode()
+                etag = self.etag(version)
+                if len(self._bodies) >= CACHE_SIZE:
+                    self._bodies.clear()
+                cached = self._bodies[key] = (etag, body)
+            return web.Response(body=cached[1], content_type='application/json',
+                                headers={'ETag': cached[0]})
+        return handle
+
+
+# Write endpoints
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text=json.dumps({'error': "Body must be JSON"}),
+                                 content_type='application/json')
+
+
+async def add_shift(request):
+    body = await _json_body(request)
+    staff_id, date = int(body['staff_id']), _date(body.get('date'), 'date')
+    shift_type, location = body['shift_type'], body['location']
+    problem = await asyncio.to_thread(utils.validate_shift, staff_id, shift_type, location)
+    if problem:
+        return _error(400, problem)
+    conflicts = []
+    added = await asyncio.to_thread(utils.add_shift, staff_id, date, shift_type, location,
+                                    conflicts.append)
+    if not added:
+        return _error(409, conflicts[0])
+    return web.json_response({'added': True}, status=201)
+
+
+async def remove_shift(request):
+    query = request.query
+    date_str = _date(query.get('date'), 'date').strftime('%Y-%m-%d')
+    await asyncio.to_thread(utils.remove_shift, int(query['staff_id']), date_str,
+                            query['location'])
+    return web.json_response({'removed': True})
+
+
+async def copy_shifts(request):
+    body = await _json_body(request)
+    source, target = _date(body.get('source'), 'source'), _date(body.get('target'), 'target')
+    kind = request.match_info['kind']
+    if kind == 'day':
+        copied = await asyncio.to_thread(utils.copy_day_shifts, source, target)
+    elif kind == 'week':
+        copied = await asyncio.to_thread(utils.copy_week_shifts, source, target)
+    else:
+        copied = await asyncio.to_thread(utils.copy_staff_shifts, int(body['staff_id']),
+                                         source, target)
+    return web.json_response({'copied': copied})
+
+
+async def export_schedule(request):
+    body = await _json_body(request)
+    start_date, end_date = _date(body.get('start'), 'start'), _date(body.get('end'), 'end')
+    file_format = body.get('format', 'csv')
+    if file_format not in EXPORT_TYPES:
+        return _error(400, "format must be csv or xlsx")
+    # Each request exports to its own temp file, removed once it has been sent
+    fd, path = tempfile.mkstemp(suffix=f'.{file_format}')
+    os.close(fd)
+    try:
+        filename = await asyncio.to_thread(utils.export_range, start_date, end_date, file_format,
+                                           path=path)
+        response = web.StreamResponse(headers={
+            'Content-Type': EXPORT_TYPES[file_format],
+            'Content-Disposition': f'attachment; filename="{filename}"'
+        })
+        await response.prepare(request)
+        with open(path, 'rb') as f:
+            while chunk := f.read(1 << 16):
+                await response.write(chunk)
+        await response.write_eof()
+        return response
+    finally:
+        os.unlink(path)
+
+
+@web.middleware
+async def bad_requests(request, handler):
+    """Turn missing or malformed fields into 400 responses."""
+    try:
+        return await handler(request)
+    except (KeyError, TypeError, ValueError) as e:
+        return _error(400, f"Bad request: {e}")
+
+
+def create_app(store=None):
+    """Build the aiohttp application over the process-wide store."""
+    store = store or get_store()
+    start_notifications(store)
+    cache = ReadCache(store)
+    app = web.Application(middlewares=[bad_requests])
+    app.add_routes([
+        web.get('/staff', cache.handler(read_staff)),
+        web.get('/shifts', cache.handler(read_shifts)),
+        web.post('/shifts', add_shift),
+        web.delete('/shifts', remove_shift),
+        web.get('/schedule/daily/{date}', cache.handler(read_daily)),
+        web.get('/schedule/weekly/{date}', cache.handler(read_weekly)),
+        web.get('/coverage/gaps', cache.handler(read_gaps)),
+        web.post('/copy/{kind:day|week|staff}', copy_shifts),
+        web.post('/export', export_schedule),
+    ])
+    return app
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    web.run_app(create_app(), port=port)
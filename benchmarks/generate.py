@@ -0,0 +1,89 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import LOCATIONS, ROLES  # noqa: E402
+
+FIRST_NAMES = ["Toby", "Jason", "Blake", "Jack", "Astrid", "Mia", "Noah", "Ava", "Liam", "Zoe",
+               "Ethan", "Chloe", "Oscar", "Ruby", "Leo", "Isla", "Max", "Grace", "Finn", "Ella"]
+LAST_NAMES = ["Sutherland", "Back", "Thiele", "Trio", "Herz", "Nguyen", "Smith", "Brown",
+              "Wilson", "Taylor", "Martin", "Lee", "Walker", "Hall", "Young", "King"]
+
+# (start, end) minute pairs people commonly work; the split pairs share a day
+SINGLE_SHIFTS = [(8 * 60 + 30, 12 * 60), (12 * 60 + 30, 17 * 60), (9 * 60, 15 * 60),
+                 (8 * 60, 16 * 60), (10 * 60, 14 * 60 + 30), (11 * 60, 12 * 60 + 30)]
+SPLIT_SHIFTS = [((8 * 60 + 30, 12 * 60), (12 * 60 + 30, 17 * 60)),
+                ((8 * 60, 10 * 60), (13 * 60, 16 * 60)),
+                ((9 * 60 + 30, 11 * 60 + 30), (14 * 60, 17 * 60))]
+
+
+def _name(i):
+    name = f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]}"
+    repeat = i // (len(FIRST_NAMES) * len(LAST_NAMES))
+    return f"{name} {repeat + 1}" if repeat else name
+
+
+def _times(minutes):
+    return np.char.add(np.char.zfill((minutes // 60).astype(str), 2),
+                       np.char.add(':', np.char.zfill((minutes % 60).astype(str), 2)))
+
+
+def generate_roster(staff_count, years, seed=0, start='2024-01-01', work_rate=0.8, split_rate=0.3):
+    """Return (staff_df, shifts_df) for staff_count people over `years` years of weekdays.
+
+    Each person works a weekday with probability work_rate, either one of
+    SINGLE_SHIFTS or, with probability split_rate, both halves of a split
+    shift, at random locations. The same seed always gives the same data.
+    """
+    rng = np.random.default_rng(seed)
+    staff_df = pd.DataFrame({
+        'id': np.arange(1, staff_count + 1),
+        'name': [_name(i) for i in range(staff_count)],
+        'role': rng.choice(ROLES, staff_count),
+    })
+
+    days = pd.bdate_range(start, periods=int(round(years * 261)))
+    day_index, staff_index = np.nonzero(rng.random((len(days), staff_count)) < work_rate)
+    split = rng.random(len(day_index)) < split_rate
+
+    single = rng.integers(len(SINGLE_SHIFTS), size=len(day_index))
+    pattern = rng.integers(len(SPLIT_SHIFTS), size=len(day_index))
+    singles = np.array(SINGLE_SHIFTS)[single]
+    firsts = np.array([pair[0] for pair in SPLIT_SHIFTS])[pattern]
+    seconds = np.array([pair[1] for pair in SPLIT_SHIFTS])[pattern]
+    spans = np.where(split[:, None], firsts, singles)
+
+    # Second halves of split shifts become extra rows for the same person and day
+    rows_day = np.concatenate([day_index, day_index[split]])
+    rows_staff = np.concatenate([staff_index, staff_index[split]])
+    rows_span = np.concatenate([spans, seconds[split]])
+    order = np.lexsort((rows_span[:, 0], rows_staff, rows_day))
+
+    shifts_df = pd.DataFrame({
+        'date': days.strftime('%Y-%m-%d').to_numpy()[rows_day[order]],
+        'staff_id': rows_staff[order] + 1,
+        'shift_type': np.char.add(np.char.add(_times(rows_span[order, 0]), '-'),
+                                  _times(rows_span[order, 1])),
+        'location': np.array(LOCATIONS)[rng.integers(len(LOCATIONS), size=len(order))],
+    })
+    return staff_df, shifts_df
+
+
+def write_roster(data_dir, staff_df, shifts_df):
+    """Write the tables as data_dir/staff.csv and data_dir/shifts.csv."""
+    os.makedirs(data_dir, exist_ok=True)
+    staff_df.to_csv(os.path.join(data_dir, 'staff.csv'), index=False)
+    shifts_df.to_csv(os.path.join(data_dir, 'shifts.csv'), index=False)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        sys.exit('usage: python benchmarks/generate.py data_dir staff years [seed]')
+    staff_df, shifts_df = generate_roster(int(sys.argv[2]), float(sys.argv[3]),
+                                          int(sys.argv[4]) if len(sys.argv) > 4 else 0)
+    write_roster(sys.argv[1], staff_df, shifts_df)
+    print(f"Wrote {len(staff_df)} staff and {len(shifts_df)} shifts to {sys.argv[1]}")
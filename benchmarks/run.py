@@ -0,0 +1,177 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# name: (staff, years); roughly 1k, 10k, 100k and 1M shifts
+SCALES = {
+    'small': (10, 0.4),
+    'medium': (100, 0.4),
+    'large': (1000, 0.4),
+    'xlarge': (1000, 4),
+}
+
+
+def _timed(fn, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1000)
+    return {'runs': repeat, 'min_ms': round(min(times), 3),
+            'median_ms': round(statistics.median(times), 3), 'max_ms': round(max(times), 3)}
+
+
+def run_scale(scale, staff_count, years, seed, repeat):
+    """Generate one scale in a scratch directory and time each operation in this process."""
+    from generate import generate_roster, write_roster
+
+    staff_df, shifts_df = generate_roster(staff_count, years, seed)
+    workdir = tempfile.mkdtemp(prefix=f"roster-bench-{scale}-")
+    write_roster(os.path.join(workdir, 'data'), staff_df, shifts_df)
+    os.chdir(workdir)
+    try:
+        return _time_operations(scale, staff_df, shifts_df, repeat)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _time_operations(scale, staff_df, shifts_df, repeat):
+    import storage
+    backend = os.environ.get('ROSTER_BACKEND', 'csv')
+    if backend in ('partitioned', 'parquet'):
+        storage.migrate_csv_to_partitions('data', 'parquet' if backend == 'parquet' else 'csv')
+    elif backend == 'sqlite':
+        storage.migrate_csv_to_sqlite('data')
+
+    import analytics
+    import schedule
+    import utils
+    from store import get_store
+
+    first = datetime.strptime(shifts_df['date'].iloc[0], '%Y-%m-%d')
+    last = datetime.strptime(shifts_df['date'].iloc[-1], '%Y-%m-%d')
+    monday = first - timedelta(days=first.weekday())
+    week = utils.get_week_dates(monday)
+    week_strs = [date.strftime('%Y-%m-%d') for date in week]
+    future = last + timedelta(days=7 - last.weekday())
+    ignore = lambda message: None  # noqa: E731
+
+    results = {}
+    results['store_load'] = _timed(lambda i: get_store(), 1)
+    results['coverage_index_build'] = _timed(lambda i: analytics.get_coverage(), 1)
+    staff = utils.load_staff()
+    # Shift reads go to the store directly so the Streamlit cache does not hide their cost
+    operations = {
+        'load_staff': lambda i: utils.load_staff(),
+        'load_shifts_day': lambda i: utils.get_store().shifts_frame([week_strs[i % 5]]),
+        'load_shifts_week': lambda i: utils.get_store().shifts_frame(week_strs),
+        'daily_grid': lambda i: schedule.build_schedule_grids(
+            utils.get_store().shifts_frame([week_strs[i % 5]]), staff, [week_strs[i % 5]],
+            utils.LOCATIONS),
+        'weekly_grid': lambda i: schedule.build_schedule_grids(
+            utils.get_store().shifts_frame(week_strs), staff, week_strs, utils.LOCATIONS),
+        'add_shift': lambda i: utils.add_shift(
+            int(staff['id'].iloc[i % len(staff)]), future + timedelta(days=i // len(staff)),
+            '08:00-09:00', utils.LOCATIONS[i % len(utils.LOCATIONS)], ignore),
+        'add_shift_conflict': lambda i: utils.add_shift(
+            int(shifts_df['staff_id'].iloc[0]), first, shifts_df['shift_type'].iloc[0],
+            shifts_df['location'].iloc[0], ignore),
+        'remove_shift': lambda i: utils.remove_shift(
+            int(staff['id'].iloc[i % len(staff)]),
+            (future + timedelta(days=i // len(staff))).strftime('%Y-%m-%d'),
+            utils.LOCATIONS[i % len(utils.LOCATIONS)]),
+        'copy_day_shifts': lambda i: utils.copy_day_shifts(
+            monday, future + timedelta(weeks=1, days=i)),
+        'copy_week_shifts': lambda i: utils.copy_week_shifts(
+            monday, future + timedelta(weeks=20 + i)),
+        'export_schedule': lambda i: utils.export_schedule(week),
+        'export_range_month': lambda i: utils.export_range(monday, monday + timedelta(days=30)),
+        'coverage_gaps_month': lambda i: utils.coverage_gaps(monday, monday + timedelta(days=30)),
+        'staff_hours_month': lambda i: utils.staff_hours(monday, monday + timedelta(days=30)),
+    }
+    for name, operation in operations.items():
+        results[name] = _timed(operation, repeat)
+    return {'scale': scale, 'staff': len(staff_df), 'shifts': len(shifts_df),
+            'backend': backend, 'operations': results}
+
+
+def run(scales, seed, repeat, output):
+    """Run each scale in a fresh interpreter and write the combined results to output."""
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'backend': os.environ.get('ROSTER_BACKEND', 'csv'),
+        'seed': seed,
+        'scales': [],
+    }
+    for scale in scales:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', scale,
+             '--seed', str(seed), '--repeat', str(repeat)],
+            stdout=subprocess.PIPE, text=True, check=True
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        report['scales'].append(result)
+        print(f"{scale}: {result['staff']} staff, {result['shifts']} shifts")
+        for name, timing in result['operations'].items():
+            print(f"  {name:<22} {timing['median_ms']:>10.2f} ms")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+def compare(before_path, after_path):
+    """Print the median time ratio (after / before) of every operation in two result files."""
+    with open(before_path) as f:
+        before = {result['scale']: result for result in json.load(f)['scales']}
+    with open(after_path) as f:
+        after = {result['scale']: result for result in json.load(f)['scales']}
+    for scale in [scale for scale in after if scale in before]:
+        print(scale)
+        for name, timing in after[scale]['operations'].items():
+            old = before[scale]['operations'].get(name)
+            if old:
+                ratio = timing['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+                print(f"  {name:<22} {old['median_ms']:>10.2f} -> {timing['median_ms']:>10.2f} ms"
+                      f"  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the roster operations on synthetic data.")
+    parser.add_argument('scales', nargs='*', default=['small', 'medium', 'large'],
+                        help=f"any of {', '.join(SCALES)}")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.worker:
+        logging.disable(logging.WARNING)
+        staff_count, years = SCALES[args.worker]
+        print(json.dumps(run_scale(args.worker, staff_count, years, args.seed, args.repeat)))
+    else:
+        unknown = set(args.scales) - set(SCALES)
+        if unknown:
+            parser.error(f"unknown scale: {', '.join(sorted(unknown))}")
+        run(args.scales, args.seed, args.repeat, os.path.abspath(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import csv
+
+import pandas as pd
+
+
+def export_chunks(shifts_df, staff_df, dates, chunk_size=500):
+    """Yield the staff x date export table in chunks of chunk_size staff rows.
+
+    Each cell lists all of that person's shifts on that day in start-time
+    order, e.g. "08:30-12:00 (Reception desk 1), 12:30-17:00 (Reception desk 1)",
+    or "Off" when there are none. The cells are built with one groupby over
+    shifts_df, which should carry start_min (see ShiftStore.shifts_frame).
+    """
+    if staff_df.empty:
+        yield pd.DataFrame(columns=['Staff Name', 'Role'] + list(dates))
+        return
+    shifts_df = shifts_df[shifts_df['date'].isin(dates)]
+    if 'start_min' in shifts_df:
+        shifts_df = shifts_df.sort_values('start_min', kind='stable')
+    labels = shifts_df['shift_type'].astype(str) + ' (' + shifts_df['location'].astype(str) + ')'
+    cells = labels.groupby([shifts_df['staff_id'], shifts_df['date']], sort=False,
+                           observed=True).agg(', '.join)
+
+    for start in range(0, len(staff_df), chunk_size):
+        staff_chunk = staff_df.iloc[start:start + chunk_size]
+        chunk_cells = cells[cells.index.get_level_values('staff_id').isin(staff_chunk['id'])]
+        matrix = (
+            chunk_cells.unstack('date')
+            .reindex(index=staff_chunk['id'], columns=dates)
+            .fillna('Off')
+        )
+        yield pd.concat([
+            pd.DataFrame({'Staff Name': staff_chunk['name'].to_numpy(),
+                          'Role': staff_chunk['role'].to_numpy()}),
+            matrix.reset_index(drop=True)
+        ], axis=1)
+
+
+def write_csv(chunks, path):
+    """Stream export chunks to a CSV file, writing the header once."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        header_written = False
+        for chunk in chunks:
+            if not header_written:
+                writer.writerow(chunk.columns)
+                header_written = True
+            writer.writerows(chunk.itertuples(index=False, name=None))
+
+
+def write_xlsx(chunks, path):
+    """Stream export chunks to an xlsx file using openpyxl's write-only mode."""
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Schedule")
+    header_written = False
+    for chunk in chunks:
+        if not header_written:
+            sheet.append(list(chunk.columns))
+            header_written = True
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(path)
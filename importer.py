@@ -0,0 +1,197 @@
+import re
+from datetime import date, datetime
+
+import pandas as pd
+
+DAY_HEADER = re.compile(
+    r'^(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)\s+(\d{1,2})/(\d{1,2})'
+)
+TIME_RANGE = re.compile(r'^(\d{1,2})[:.](\d{2})\s*-\s*(\d{1,2})[:.](\d{2})$')
+WEEK_ENDING = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+SHEET_WEEK_ENDING = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{2,4})')
+STAFF_HOURS = re.compile(r'\{([^}]*)\}')
+DAY_OFF = re.compile(r'non-working|leave', re.IGNORECASE)
+
+IMPORT_COLUMNS = ['source', 'date', 'staff', 'staff_id', 'shift_type', 'location', 'reason']
+HOURS_COLUMNS = ['staff', 'date', 'hours']
+
+
+def normalize_time_range(text):
+    """Return "8.30-12:00"-style text as "08:30-12:00", or None if it is not a time range."""
+    match = TIME_RANGE.match(text.strip())
+    if not match:
+        return None
+    start_h, start_m, end_h, end_m = (int(part) for part in match.groups())
+    return f"{start_h:02d}:{start_m:02d}-{end_h:02d}:{end_m:02d}"
+
+
+def _week_ending(sheet):
+    """Find the week-ending date from the sheet's title cell or name."""
+    title = re.sub(r'\s+', '', str(sheet.cell(1, 1).value or ''))
+    match = WEEK_ENDING.search(title)
+    if match:
+        day, month, year = (int(part) for part in match.groups())
+        return date(year, month, day)
+    match = SHEET_WEEK_ENDING.search(sheet.title)
+    if match:
+        day, month, year = (int(part) for part in match.groups())
+        return date(year if year > 99 else 2000 + year, month, day)
+    return datetime.now().date()
+
+
+def _day_date(day, month, week_ending):
+    shift_date = date(week_ending.year, month, day)
+    if shift_date > week_ending:
+        shift_date = date(week_ending.year - 1, month, day)
+    return shift_date.strftime('%Y-%m-%d')
+
+
+def read_roster_sheet(sheet):
+    """Read one sheet in the team's weekly roster layout into candidate shift rows.
+
+    Each day starts with a row holding "Monday 24/2" in column B and a staff
+    name at the top of each staff member's am/pm column pair, followed by one
+    row per location whose cells list that person's time ranges. Cells with
+    anything other than time ranges are returned with a reason so they can
+    be reported instead of guessed at.
+    """
+    week_ending = _week_ending(sheet)
+    rows = []
+    day_str, staff_columns = None, []
+    for row in sheet.iter_rows(min_row=1):
+        label = row[1].value if len(row) > 1 else None
+        if label is None:
+            continue
+        label = str(label).strip()
+        header = DAY_HEADER.match(label)
+        if header:
+            day_str = _day_date(int(header.group(2)), int(header.group(3)), week_ending)
+            starts = [cell.column for cell in row[2:] if cell.value is not None]
+            ends = starts[1:] + [starts[-1] + 2 if starts else 0]
+            staff_columns = [
+                (str(row[start - 1].value).split('\n')[0].strip(), start, end)
+                for start, end in zip(starts, ends)
+            ]
+            continue
+        if day_str is None:
+            continue
+        for staff_name, start, end in staff_columns:
+            for cell in row[start - 1:end - 1]:
+                if cell.value is None:
+                    continue
+                tokens = [token.strip() for token in re.split(r'[\n;]+', str(cell.value))]
+                tokens = [token for token in tokens if token]
+                shift_types = [normalize_time_range(token) for token in tokens]
+                unrecognised = [token for token, shift_type in zip(tokens, shift_types)
+                                if shift_type is None]
+                reason = f"Unrecognised entry: {', '.join(unrecognised)}" if unrecognised else None
+                for token, shift_type in zip(tokens, shift_types):
+                    rows.append({
+                        'source': f"{sheet.title}!{cell.coordinate}",
+                        'date': day_str,
+                        'staff': staff_name,
+                        'staff_id': None,
+                        'shift_type': shift_type or token,
+                        'location': label,
+                        'reason': reason,
+                    })
+    return pd.DataFrame(rows, columns=IMPORT_COLUMNS)
+
+
+def read_roster_hours(sheet):
+    """Read each staff member's hours from the day headers of a weekly roster sheet.
+
+    A staff name in a day header may carry that day's hours on its second
+    line, as in "Jack Herz\n{8:30-17:00}", and the cell under the name says
+    "non-working day" or "on leave" when they are off. Returns one row per
+    staff member and day that has either, with hours as "08:30-17:00" or
+    None for a day off.
+    """
+    week_ending = _week_ending(sheet)
+    rows = []
+    pending = []
+    for row in sheet.iter_rows(min_row=1):
+        # The row under a day header holds the day-off marks, if any
+        for column, staff_name, day_str, hours in pending:
+            mark = row[column - 1].value if len(row) >= column else None
+            if mark is not None and DAY_OFF.search(str(mark)):
+                rows.append({'staff': staff_name, 'date': day_str, 'hours': None})
+            elif hours:
+                rows.append({'staff': staff_name, 'date': day_str, 'hours': hours})
+        pending = []
+        label = row[1].value if len(row) > 1 else None
+        header = DAY_HEADER.match(str(label).strip()) if label is not None else None
+        if not header:
+            continue
+        day_str = _day_date(int(header.group(2)), int(header.group(3)), week_ending)
+        for cell in row[2:]:
+            if cell.value is None:
+                continue
+            staff_name, _, rest = str(cell.value).partition('\n')
+            hours = STAFF_HOURS.search(rest)
+            pending.append((cell.column, staff_name.strip(), day_str,
+                            normalize_time_range(hours.group(1)) if hours else None))
+    rows.extend({'staff': staff_name, 'date': day_str, 'hours': hours}
+                for _, staff_name, day_str, hours in pending if hours)
+    return pd.DataFrame(rows, columns=HOURS_COLUMNS)
+
+
+def read_shift_frame(shifts_df):
+    """Normalize a DataFrame of shifts into candidate shift rows.
+
+    The frame needs date, shift_type and location columns plus either
+    staff_id or a staff name column ('staff' or 'name').
+    """
+    missing = {'date', 'shift_type', 'location'} - set(shifts_df.columns)
+    if missing or not {'staff_id', 'staff', 'name'} & set(shifts_df.columns):
+        raise ValueError(
+            "Shift import needs date, shift_type, location and staff_id or staff columns"
+        )
+    candidates = pd.DataFrame({
+        'source': [f"row {label}" for label in shifts_df.index],
+        'date': pd.to_datetime(shifts_df['date'], errors='coerce').dt.strftime('%Y-%m-%d'),
+        'staff': shifts_df.get('staff', shifts_df.get('name')),
+        'staff_id': shifts_df.get('staff_id'),
+        'shift_type': shifts_df['shift_type'].astype(str).map(
+            lambda text: normalize_time_range(text) or text
+        ),
+        'location': shifts_df['location'].astype(str).str.strip(),
+        'reason': None,
+    }, columns=IMPORT_COLUMNS)
+    candidates.loc[candidates['date'].isna(), 'reason'] = "Invalid date"
+    return candidates
+
+
+def read_shifts(source):
+    """Read candidate shift rows from a DataFrame or an xlsx file (path or file object).
+
+    Workbooks with a date/shift_type/location header row are read as plain
+    tables; anything else is read as the weekly roster layout.
+    """
+    if isinstance(source, pd.DataFrame):
+        return read_shift_frame(source)
+
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(source, data_only=True)
+    frames = []
+    for sheet in workbook.worksheets:
+        values = list(sheet.values)
+        header = [str(value).strip() for value in values[0]] if values else []
+        if {'date', 'shift_type', 'location'} <= set(header):
+            table = pd.DataFrame(values[1:], columns=header,
+                                 index=range(2, len(values) + 1))
+            frames.append(read_shift_frame(table.dropna(how='all')))
+        else:
+            frames.append(read_roster_sheet(sheet))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=IMPORT_COLUMNS)
+
+
+def read_staff_hours(source):
+    """Read the staff hours in the day headers of every roster sheet in an xlsx file."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(source, data_only=True)
+    frames = [read_roster_hours(sheet) for sheet in workbook.worksheets]
+    return (pd.concat(frames, ignore_index=True) if frames
+            else pd.DataFrame(columns=HOURS_COLUMNS))
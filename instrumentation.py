@@ -0,0 +1,101 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+# ROSTER_PROFILE=1 runs every outermost span under cProfile and keeps the latest captures
+PROFILE = os.environ.get('ROSTER_PROFILE', '') not in ('', '0')
+MAX_PROFILES = 20
+PROFILE_LINES = 30
+
+_lock = threading.Lock()
+_local = threading.local()
+_spans = defaultdict(lambda: {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+_counters = defaultdict(int)
+_profiles = deque(maxlen=MAX_PROFILES)
+_since = time.time()
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block under name; spans may nest and are totalled per name."""
+    depth = getattr(_local, 'depth', 0)
+    profiler = cProfile.Profile() if PROFILE and depth == 0 else None
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    if profiler:
+        try:
+            profiler.enable()
+        except ValueError:
+            profiler = None  # another thread is already profiling (Python 3.12+)
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        elapsed = (time.perf_counter() - start) * 1000
+        _local.depth = depth
+        with _lock:
+            stats = _spans[name]
+            stats['calls'] += 1
+            stats['total_ms'] += elapsed
+            stats['max_ms'] = max(stats['max_ms'], elapsed)
+        if profiler:
+            _profiles.append(_profile_entry(name, elapsed, profiler))
+
+
+def timed(fn):
+    """Decorator that wraps each call of fn in a span named after its module and function."""
+    name = f"{fn.__module__.replace('__main__', 'main')}.{fn.__qualname__}"
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def count(name, amount=1):
+    """Add amount to the counter called name, e.g. rows_read or bytes_written."""
+    with _lock:
+        _counters[name] += amount
+
+
+def _profile_entry(name, elapsed, profiler):
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    return {'span': name, 'at': time.time(), 'ms': round(elapsed, 3), 'stats': output.getvalue()}
+
+
+def snapshot():
+    """Return the spans, counters and profile captures collected since the last reset."""
+    with _lock:
+        spans = {
+            name: {'calls': stats['calls'], 'total_ms': round(stats['total_ms'], 3),
+                   'mean_ms': round(stats['total_ms'] / stats['calls'], 3),
+                   'max_ms': round(stats['max_ms'], 3)}
+            for name, stats in _spans.items()
+        }
+        return {'since': _since, 'profiling': PROFILE, 'spans': spans,
+                'counters': dict(_counters), 'profiles': list(_profiles)}
+
+
+def export_json():
+    """Return snapshot() as a JSON string."""
+    return json.dumps(snapshot(), indent=2)
+
+
+def reset():
+    """Forget everything collected so far."""
+    global _since
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _profiles.clear()
+        _since = time.time()
@@ -1,8 +1,11 @@
+import os
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+import instrumentation
 import utils
-import os
+import schedule
+import solver
 
 # Initialize session state
 if 'current_date' not in st.session_state:
@@ -15,30 +18,30 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize data files if they don't exist
-if not os.path.exists('data'):
-    os.makedirs('data')
-
-if not os.path.exists('data/staff.csv'):
-    pd.DataFrame(columns=['id', 'name', 'role']).to_csv('data/staff.csv', index=False)
-
-if not os.path.exists('data/shifts.csv'):
-    pd.DataFrame(columns=['date', 'staff_id', 'shift_type', 'location']).to_csv('data/shifts.csv', index=False)
-
 def main():
     st.title("📅 Staff Roster Management")
+    utils.enable_notifications()
 
     # Sidebar navigation
     st.sidebar.title("Navigation")
-    page = st.sidebar.radio("Go to", ["Daily Schedule", "Weekly View", "Staff Management"])
+    pages = ["Daily Schedule", "Weekly View", "Coverage Dashboard", "Staff Management"]
+    # The diagnostics page is only listed when asked for with ?diagnostics=1 or ROSTER_DIAGNOSTICS=1
+    if st.query_params.get("diagnostics") == "1" or os.environ.get("ROSTER_DIAGNOSTICS") == "1":
+        pages.append("Diagnostics")
+    page = st.sidebar.radio("Go to", pages)
 
     if page == "Daily Schedule":
         show_daily_schedule()
     elif page == "Weekly View":
         show_weekly_schedule()
+    elif page == "Coverage Dashboard":
+        show_coverage_dashboard()
+    elif page == "Diagnostics":
+        show_diagnostics()
     else:
         show_staff_management()
 
+@instrumentation.timed
 def show_weekly_schedule():
     # Get the Monday of current week
     monday = st.session_state.current_date - timedelta(days=st.session_state.current_date.weekday())
@@ -55,22 +58,11 @@ def show_weekly_schedule():
         if st.button("Next Week →"):
             st.session_state.current_date = monday + timedelta(days=7)
 
-    # Load data
-    staff_df = pd.read_csv('data/staff.csv')
-    shifts_df = pd.read_csv('data/shifts.csv')
-
     # Create week date range
     week_dates = [monday + timedelta(days=i) for i in range(7)]
 
     # Define locations
-    locations = [
-        "Reception desk 1",
-        "Reception desk 2",
-        "A-Team Office",
-        "Morning Tea break",
-        "Lunch",
-        "Reception backup"
-    ]
+    locations = utils.LOCATIONS
 
     # Add copy week functionality
     st.divider()
@@ -90,86 +82,145 @@ def show_weekly_schedule():
             else:
                 st.warning("No shifts to copy for this week")
 
-    st.divider()
-    # Create tabs for each day
-    tabs = st.tabs([date.strftime("%A %d/%m") for date in week_dates])
-
-    for i, (tab, date) in enumerate(zip(tabs, week_dates)):
-        with tab:
-            date_str = date.strftime('%Y-%m-%d')
-            day_shifts = shifts_df[shifts_df['date'] == date_str]
-
-            # Create schedule table
-            schedule_data = []
-            for location in locations:
-                row = {'Location': location}
-                for staff in staff_df.itertuples():
-                    shifts = day_shifts[(day_shifts['staff_id'] == staff.id) & 
-                                      (day_shifts['location'] == location)]
-                    shift_text = ""
-                    if not shifts.empty:
-                        shift_times = shifts['shift_type'].tolist()
-                        shift_text = ", ".join(shift_times)
-                    row[staff.name] = shift_text
-                schedule_data.append(row)
-
-            schedule_df = pd.DataFrame(schedule_data)
-
-            # Configure column styling
-            column_config = {
-                "Location": st.column_config.Column(width="medium")
+    # Roll this week out as a recurring template
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        rollout_until = st.date_input("Repeat this week's schedule until",
+                                      value=monday + timedelta(weeks=4),
+                                      key="rollout_until")
+    with col2:
+        rollout_every = st.number_input("Every N weeks", min_value=1, max_value=52, value=1,
+                                        key="rollout_every")
+    with col3:
+        if st.button("Roll Out Week"):
+            target_mondays = utils.recurring_dates(monday, rollout_until, rollout_every)
+            copied = utils.rollout_shifts(monday, week_end, target_mondays)
+            if copied:
+                st.success(f"Copied {copied} shifts across {len(target_mondays)} weeks")
+                st.rerun()
+            else:
+                st.warning("No shifts to copy for this week")
+
+    # Fill the open locations for the week automatically
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Auto-fill Week"):
+            added, uncovered = utils.auto_schedule(monday)
+            if added:
+                st.success(f"Added {added} shifts")
+                st.rerun()
+            elif uncovered:
+                st.warning(f"{uncovered} minutes of location cover could not be filled")
+            else:
+                st.info("This week is already fully covered")
+    with col2:
+        with st.expander("Auto-fill roles"):
+            st.caption("Roles that may cover each location; leave a location empty for anyone. "
+                       "Staff hours come from imported rosters and data/availability.csv.")
+            saved_roles = utils.load_location_roles()
+            location_roles = {
+                location: st.multiselect(location, utils.ROLES,
+                                         default=[role for role in saved_roles.get(location, [])
+                                                  if role in utils.ROLES],
+                                         key=f"roles_{location}")
+                for location in solver.DEFAULT_COVERAGE
             }
-            for staff in staff_df.itertuples():
-                column_config[staff.name] = st.column_config.Column(width="medium")
+            if st.button("Save Roles"):
+                utils.save_location_roles(location_roles)
+                st.success("Saved the auto-fill roles")
 
-            # Display schedule table
-            st.dataframe(
-                schedule_df,
-                use_container_width=True,
-                hide_index=True,
-                column_config=column_config
-            )
+    # Export a date range
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        export_start = st.date_input("Export from", value=monday, key="export_start")
+    with col2:
+        export_end = st.date_input("Export to", value=week_end, key="export_end")
+    with col3:
+        export_format = st.selectbox("Format", ["csv", "xlsx"], key="export_format")
+    with col4:
+        if st.button("Export Range"):
+            if export_end < export_start:
+                st.error("Export end date must not be before the start date")
+            else:
+                export_filename = utils.export_range(export_start, export_end, export_format)
+                st.success(f"Exported schedule to {export_filename}")
+
+    st.divider()
+    # Only the selected day's table and controls are built on each rerun
+    i = st.radio(
+        "Day",
+        options=range(7),
+        format_func=lambda i: week_dates[i].strftime("%A %d/%m"),
+        horizontal=True,
+        label_visibility="collapsed",
+        key="week_day"
+    )
+    date = week_dates[i]
+    date_str = date.strftime('%Y-%m-%d')
+
+    # Load data
+    staff_df = utils.load_staff()
+    registry = utils.load_registry()
+    shifts_df = utils.load_shifts([date_str])
+    grids = schedule.build_schedule_grids(shifts_df, staff_df, [date_str], locations)
+    schedule_df = grids[date_str]
+
+    # Configure column styling
+    column_config = {
+        "Location": st.column_config.Column(width="medium")
+    }
+    for label in schedule.staff_labels(staff_df):
+        column_config[label] = st.column_config.Column(width="medium")
 
-            # Add copy functionality
-            st.divider()
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                target_date = st.date_input(f"Copy {date.strftime('%A')} schedule to", 
-                                          value=date,
-                                          key=f"copy_date_{i}")
-            with col2:
-                if st.button("Copy Schedule", key=f"copy_btn_{i}"):
-                    if utils.copy_day_shifts(date, target_date):
-                        st.success(f"Copied schedule to {target_date.strftime('%Y-%m-%d')}")
-                        st.rerun()
-                    else:
-                        st.warning("No shifts to copy for this day")
-
-            # Copy specific staff member's shifts
-            st.divider()
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                staff_df = pd.read_csv('data/staff.csv')
-                selected_staff = st.selectbox(
-                    "Copy shifts for staff member",
-                    options=staff_df['name'].tolist(),
-                    key=f"copy_staff_{i}"
-                )
-                staff_id = staff_df[staff_df['name'] == selected_staff]['id'].iloc[0]
-            with col2:
-                target_date = st.date_input(
-                    "to date",
-                    value=date + timedelta(days=7),
-                    key=f"copy_staff_date_{i}"
-                )
-            with col3:
-                if st.button("Copy Staff Schedule", key=f"copy_staff_btn_{i}"):
-                    if utils.copy_staff_shifts(staff_id, date, target_date):
-                        st.success(f"Copied {selected_staff}'s schedule to {target_date.strftime('%Y-%m-%d')}")
-                        st.rerun()
-                    else:
-                        st.warning(f"No shifts to copy for {selected_staff} on this day")
+    # Display schedule table
+    st.dataframe(
+        schedule_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config=column_config
+    )
 
+    # Add copy functionality
+    st.divider()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        target_date = st.date_input(f"Copy {date.strftime('%A')} schedule to",
+                                  value=date,
+                                  key=f"copy_date_{i}")
+    with col2:
+        if st.button("Copy Schedule", key=f"copy_btn_{i}"):
+            if utils.copy_day_shifts(date, target_date):
+                st.success(f"Copied schedule to {target_date.strftime('%Y-%m-%d')}")
+                st.rerun()
+            else:
+                st.warning("No shifts to copy for this day")
+
+    # Copy specific staff member's shifts
+    st.divider()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        staff_id = st.selectbox(
+            "Copy shifts for staff member",
+            options=registry.ids.tolist(),
+            format_func=registry.name_of,
+            key=f"copy_staff_{i}"
+        )
+        selected_staff = registry.name_of(staff_id)
+    with col2:
+        target_date = st.date_input(
+            "to date",
+            value=date + timedelta(days=7),
+            key=f"copy_staff_date_{i}"
+        )
+    with col3:
+        if st.button("Copy Staff Schedule", key=f"copy_staff_btn_{i}"):
+            if utils.copy_staff_shifts(staff_id, date, target_date):
+                st.success(f"Copied {selected_staff}'s schedule to {target_date.strftime('%Y-%m-%d')}")
+                st.rerun()
+            else:
+                st.warning(f"No shifts to copy for {selected_staff} on this day")
+
+@instrumentation.timed
 def show_daily_schedule():
     # Date navigation
     col1, col2, col3 = st.columns([1,3,1])
@@ -182,40 +233,19 @@ def show_daily_schedule():
         if st.button("Next Day →"):
             st.session_state.current_date += timedelta(days=1)
 
-    # Load data
-    staff_df = pd.read_csv('data/staff.csv')
-    shifts_df = pd.read_csv('data/shifts.csv')
-
     # Define locations in order
-    locations = [
-        "Reception desk 1",
-        "Reception desk 2",
-        "A-Team Office",
-        "Morning Tea break",
-        "Lunch",
-        "Reception backup"
-    ]
-
-    # Get current date's shifts
+    locations = utils.LOCATIONS
+
+    # Load data for the current date
     current_date_str = st.session_state.current_date.strftime('%Y-%m-%d')
-    day_shifts = shifts_df[shifts_df['date'] == current_date_str]
+    staff_df = utils.load_staff()
+    registry = utils.load_registry()
+    day_shifts = utils.load_shifts([current_date_str])
 
     # Create schedule table with staff as columns and locations as rows
-    schedule_data = []
-    for location in locations:
-        row = {'Location': location}
-        for staff in staff_df.itertuples():
-            shifts = day_shifts[(day_shifts['staff_id'] == staff.id) & 
-                              (day_shifts['location'] == location)]
-            shift_text = ""
-            if not shifts.empty:
-                shift_times = shifts['shift_type'].tolist()
-                shift_text = ", ".join(shift_times)
-            row[staff.name] = shift_text
-        schedule_data.append(row)
-
-    # Create DataFrame and configure display
-    schedule_df = pd.DataFrame(schedule_data)
+    schedule_df = schedule.build_schedule_grids(
+        day_shifts, staff_df, [current_date_str], locations
+    )[current_date_str]
 
     # Configure column styling
     column_config = {
@@ -225,8 +255,8 @@ def show_daily_schedule():
     }
 
     # Add configuration for staff columns
-    for staff in staff_df.itertuples():
-        column_config[staff.name] = st.column_config.Column(
+    for label in schedule.staff_labels(staff_df):
+        column_config[label] = st.column_config.Column(
             width="medium"
         )
 
@@ -238,32 +268,46 @@ def show_daily_schedule():
         column_config=column_config
     )
 
-    # Display individual shifts with remove buttons
+    # List the day's shifts in one editor; ticked rows are removed together
     st.subheader("Current Shifts")
-    for location in locations:
-        shifts = day_shifts[day_shifts['location'] == location]
-        if not shifts.empty:
-            for _, shift in shifts.iterrows():
-                staff_name = staff_df[staff_df['id'] == shift['staff_id']]['name'].iloc[0]
-                col1, col2, col3 = st.columns([2, 2, 1])
-                with col1:
-                    st.write(f"**Location:** {location}")
-                with col2:
-                    st.write(f"**Staff:** {staff_name} ({shift['shift_type']})")
-                with col3:
-                    if st.button("🗑️ Remove Shift", key=f"remove_shift_{shift['staff_id']}_{location}_{shift['shift_type']}_{current_date_str}"):
-                        utils.remove_shift(shift['staff_id'], current_date_str, location)
-                        st.success(f"Removed shift for {staff_name}")
-                        st.rerun()
+    current_shifts = (
+        day_shifts[day_shifts['location'].isin(locations)]
+        .astype({'location': str, 'shift_type': str})
+        .assign(name=lambda df: df['staff_id'].map(registry.name_of))
+        .dropna(subset=['name'])
+        .assign(location_order=lambda df: df['location'].map(locations.index))
+        .sort_values(['location_order', 'shift_type'])
+        .reset_index(drop=True)
+    )
+    if not current_shifts.empty:
+        edited = st.data_editor(
+            current_shifts[['location', 'name', 'shift_type']].assign(remove=False),
+            column_config={
+                "location": st.column_config.Column("Location", width="medium"),
+                "name": st.column_config.Column("Staff", width="medium"),
+                "shift_type": st.column_config.Column("Shift"),
+                "remove": st.column_config.CheckboxColumn("Remove"),
+            },
+            disabled=["location", "name", "shift_type"],
+            use_container_width=True,
+            hide_index=True,
+            key=f"current_shifts_{current_date_str}"
+        )
+        selected = current_shifts[edited['remove'].to_numpy()]
+        if st.button("🗑️ Remove Selected Shifts", disabled=selected.empty):
+            utils.remove_shifts(selected)
+            st.success(f"Removed {len(selected)} shifts")
+            st.rerun()
 
     # Add new shift
     st.subheader("Add Shift")
     with st.form("add_shift"):
         col1, col2, col3, col4, col5 = st.columns(5)
         with col1:
-            selected_staff = st.selectbox("Select Staff", 
-                                        options=staff_df['name'].tolist(),
-                                        key="staff_select")
+            staff_id = st.selectbox("Select Staff",
+                                    options=registry.ids.tolist(),
+                                    format_func=registry.name_of,
+                                    key="staff_select")
         with col2:
             selected_date = st.date_input("Select Date", 
                                         value=st.session_state.current_date,
@@ -296,7 +340,6 @@ def show_daily_schedule():
                 st.error("End time must be after start time")
             else:
                 shift_type = f"{start_str}-{end_str}"
-                staff_id = staff_df[staff_df['name'] == selected_staff]['id'].iloc[0]
                 if utils.add_shift(staff_id, selected_date, shift_type, location):
                     st.success("Shift added successfully!")
                     st.rerun()
@@ -306,35 +349,92 @@ def show_daily_schedule():
         utils.export_schedule([st.session_state.current_date])
         st.success("Schedule exported successfully!")
 
+    # Bulk import
+    st.subheader("Import Roster")
+    uploaded_roster = st.file_uploader("Roster spreadsheet (.xlsx)", type=["xlsx"])
+    if uploaded_roster is not None and st.button("Import Shifts"):
+        imported, rejected = utils.import_shifts(uploaded_roster)
+        st.success(f"Imported {imported} shifts")
+        hours = utils.import_availability(uploaded_roster)
+        if hours:
+            st.info(f"Saved {hours} staff hours from the roster headers for auto-fill")
+        if not rejected.empty:
+            st.warning(f"{len(rejected)} rows were rejected")
+            st.dataframe(
+                rejected[['source', 'date', 'staff', 'shift_type', 'location', 'reason']],
+                use_container_width=True,
+                hide_index=True
+            )
+
+@instrumentation.timed
+def show_coverage_dashboard():
+    st.subheader("Coverage Dashboard")
+
+    # Default to the month containing the current date
+    first = st.session_state.current_date.replace(day=1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("From", value=first, key="dashboard_start")
+    with col2:
+        end_date = st.date_input("To", value=last, key="dashboard_end")
+    if end_date < start_date:
+        st.error("End date must not be before the start date")
+        return
+
+    gaps = utils.coverage_gaps(start_date, end_date)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Uncovered hours", f"{gaps['minutes'].sum() / 60:.1f}")
+    with col2:
+        st.metric("Days with gaps", gaps['date'].nunique())
+
+    st.subheader("Uncovered Time Slots")
+    if gaps.empty:
+        st.success("Every location is covered")
+    else:
+        st.dataframe(
+            gaps.pivot_table(index='date', columns='location', values='minutes',
+                             aggfunc='sum', fill_value=0),
+            use_container_width=True
+        )
+        st.dataframe(gaps, use_container_width=True, hide_index=True)
+
+    st.subheader("Hours Worked per Week")
+    st.dataframe(utils.staff_hours(start_date, end_date), use_container_width=True,
+                 hide_index=True)
+
+@instrumentation.timed
 def show_staff_management():
     st.subheader("Staff Management")
 
-    # Display current staff with edit functionality
-    staff_df = pd.read_csv('data/staff.csv')
-
-    # Create columns for each staff member's details
-    for idx, staff in staff_df.iterrows():
-        col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
-        with col1:
-            st.write(f"**Name:** {staff['name']}")
-        with col2:
-            new_role = st.selectbox(
-                "Role",
-                options=["Manager", "Senior Staff", "Junior Staff", "Supported Employee", "Admin Assistant"],
-                key=f"role_{staff['id']}_{idx}",
-                index=["Manager", "Senior Staff", "Junior Staff", "Supported Employee", "Admin Assistant"].index(staff['role'])
-            )
-        with col3:
-            if st.button("Update Role", key=f"update_{staff['id']}_{idx}"):
-                utils.update_staff_role(staff['id'], new_role)
-                st.success(f"Updated role for {staff['name']}")
-                st.rerun()
-        with col4:
-            if st.button("🗑️ Remove", key=f"remove_{staff['id']}_{idx}", type="secondary"):
-                utils.remove_staff(staff['id'])
-                st.success(f"Removed {staff['name']}")
-                st.rerun()
-        st.divider()
+    # Edit one page of staff at a time; all changes are saved in one write
+    staff_df = utils.load_staff()
+    page_size = 50
+    pages = max((len(staff_df) - 1) // page_size + 1, 1)
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1,
+                           key="staff_page") if pages > 1 else 1
+    staff_page = staff_df.iloc[(page - 1) * page_size:page * page_size]
+
+    edited = st.data_editor(
+        staff_page[['name', 'role']].assign(remove=False),
+        column_config={
+            "name": st.column_config.Column("Name", width="medium"),
+            "role": st.column_config.SelectboxColumn("Role", options=utils.ROLES, required=True),
+            "remove": st.column_config.CheckboxColumn("Remove"),
+        },
+        disabled=["name"],
+        use_container_width=True,
+        hide_index=True,
+        key=f"staff_editor_{page}"
+    )
+    changed = edited['role'].to_numpy() != staff_page['role'].to_numpy()
+    roles = dict(zip(staff_page['id'][changed], edited['role'][changed]))
+    removed = staff_page['id'][edited['remove'].to_numpy()].tolist()
+    if st.button("Save Changes", disabled=not roles and not removed):
+        utils.apply_staff_edits(roles, removed)
+        st.success(f"Updated {len(roles)} roles and removed {len(removed)} staff")
+        st.rerun()
 
     # Add new staff
     st.subheader("Add New Staff")
@@ -343,12 +443,45 @@ def show_staff_management():
         with col1:
             new_name = st.text_input("Name")
         with col2:
-            new_role = st.selectbox("Role", ["Manager", "Senior Staff", "Junior Staff", "Supported Employee", "Admin Assistant"])
+            new_role = st.selectbox("Role", utils.ROLES)
 
         if st.form_submit_button("Add Staff"):
             utils.add_staff(new_name, new_role)
             st.success("Staff member added successfully!")
             st.rerun()
 
+def show_diagnostics():
+    st.subheader("Diagnostics")
+    report = instrumentation.snapshot()
+    since = datetime.fromtimestamp(report['since']).strftime('%Y-%m-%d %H:%M:%S')
+    st.caption(f"Collected since {since}"
+               + ("; cProfile capture is on" if report['profiling'] else
+                  "; set ROSTER_PROFILE=1 to capture cProfile stats"))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download JSON", instrumentation.export_json(),
+                           file_name="roster_diagnostics.json", mime="application/json")
+    with col2:
+        if st.button("Reset"):
+            instrumentation.reset()
+            st.rerun()
+
+    st.subheader("Timing Spans")
+    spans = pd.DataFrame.from_dict(report['spans'], orient='index')
+    if not spans.empty:
+        spans = spans.sort_values('total_ms', ascending=False).rename_axis('span').reset_index()
+    st.dataframe(spans, use_container_width=True, hide_index=True)
+
+    st.subheader("I/O Counters")
+    st.dataframe(pd.DataFrame(list(report['counters'].items()), columns=['counter', 'value']),
+                 use_container_width=True, hide_index=True)
+
+    if report['profiles']:
+        st.subheader("Profiles")
+        for profile in reversed(report['profiles']):
+            with st.expander(f"{profile['span']} ({profile['ms']:.1f} ms)"):
+                st.code(profile['stats'])
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from itertools import accumulate
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CONTACTS_FILE = 'contacts.csv'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Twilio rejects message bodies longer than this
+MAX_MESSAGE_LENGTH = 1600
+
+
+def load_contacts(data_dir='data'):
+    """Return {staff_id: phone number} from data/contacts.csv (staff_id,phone), if it exists."""
+    try:
+        contacts = pd.read_csv(os.path.join(data_dir, CONTACTS_FILE), dtype={'phone': str})
+    except FileNotFoundError:
+        return {}
+    contacts = contacts.dropna(subset=['phone'])
+    return dict(zip(contacts['staff_id'].astype(int), contacts['phone'].str.strip()))
+
+
+def coalesce(events):
+    """Group (removed, added) change events into {staff_id: (removed, added)} per person.
+
+    A shift that is removed and added again within the batch (as when a copy
+    overwrites a day with the same shifts) cancels out, and so does one added
+    and then removed.
+    """
+    changes = defaultdict(dict)
+    for removed, added in events:
+        for record in removed:
+            changes[record[1]][record] = changes[record[1]].get(record, 0) - 1
+        for record in added:
+            changes[record[1]][record] = changes[record[1]].get(record, 0) + 1
+    people = {}
+    for staff_id, counts in changes.items():
+        removed = sorted(record for record, count in counts.items() if count < 0)
+        added = sorted(record for record, count in counts.items() if count > 0)
+        if removed or added:
+            people[staff_id] = (removed, added)
+    return people
+
+
+def format_message(name, removed, added, limit=MAX_MESSAGE_LENGTH):
+    """Return the SMS text describing one person's roster changes.
+
+    Changes that would take the text past limit characters are left off the
+    end and summed up in a last line giving their count and dates.
+    """
+    def day(date):
+        return datetime.strptime(date, '%Y-%m-%d').strftime('%a %d/%m')
+
+    changes = [('+', record) for record in added] + [('-', record) for record in removed]
+    lines = [f"Hi {name}, your roster has changed:"]
+    lines += [f"{sign} {day(date)} {shift_type} {location}"
+              for sign, (date, _, shift_type, location) in changes]
+    text = '\n'.join(lines)
+    if len(text) <= limit:
+        return text
+
+    # Keep as many changes as fit alongside a summary of the ones left off
+    ends = list(accumulate(len(line) + 1 for line in lines))
+    dates = [record[0] for _, record in changes]
+    firsts = list(accumulate(reversed(dates), min))[::-1]
+    lasts = list(accumulate(reversed(dates), max))[::-1]
+    for kept in range(len(changes) - 1, -1, -1):
+        summary = (f"...and {len(changes) - kept} more changes, "
+                   f"{day(firsts[kept])} to {day(lasts[kept])}")
+        if ends[kept] + len(summary) <= limit:
+            return '\n'.join(lines[:kept + 1] + [summary])
+    return text[:limit]
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = max(self._next, time.monotonic()) + self.interval
+
+
+class ShiftNotifier:
+    """Queues shift changes and texts each affected person one coalesced message.
+
+    notify() can be called from any thread; events are handed to an asyncio
+    loop running in a daemon thread. The first event of a batch starts a
+    batch_window second timer, after which every queued event is coalesced
+    per person and sent with at most `concurrency` requests in flight and at
+    most `rate` sends per second. Sends that fail with a retryable status or
+    a connection error are retried with exponential backoff.
+
+    send is an async callable send(to, body); see twilio_sender().
+    """
+
+    def __init__(self, send, store, data_dir='data', concurrency=4, rate=10, retries=3,
+                 batch_window=2.0, backoff=0.5):
+        self.send = send
+        self.store = store
+        self.data_dir = data_dir
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.batch_window = batch_window
+        self.backoff = backoff
+        self.sent = 0
+        self.failed = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='shift-notifier', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._limiter = RateLimiter(self.rate)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._loop.create_task(self._worker())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def notify(self, removed, added):
+        """Queue one change; safe to call from any thread, e.g. as a ShiftStore commit hook."""
+        self._loop.call_soon_threadsafe(self._enqueue, (list(removed), list(added)))
+
+    def _enqueue(self, event):
+        self._idle.clear()
+        self._queue.put_nowait(event)
+
+    def flush(self, timeout=None):
+        """Block until every queued change has been sent (or given up on)."""
+        async def wait_idle():
+            await self._idle.wait()
+        asyncio.run_coroutine_threadsafe(wait_idle(), self._loop).result(timeout)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _worker(self):
+        while True:
+            events = [await self._queue.get()]
+            await asyncio.sleep(self.batch_window)
+            while not self._queue.empty():
+                events.append(self._queue.get_nowait())
+            try:
+                await self._dispatch(coalesce(events))
+            except Exception:
+                logger.exception("Failed to send shift notifications")
+            if self._queue.empty():
+                self._idle.set()
+
+    async def _dispatch(self, people):
+        contacts = await asyncio.to_thread(load_contacts, self.data_dir)
+        staff_df = self.store.staff_frame()
+        names = dict(zip(staff_df['id'], staff_df['name']))
+        messages = [
+            (contacts[staff_id], format_message(names.get(staff_id, 'there'), removed, added))
+            for staff_id, (removed, added) in people.items() if staff_id in contacts
+        ]
+        await asyncio.gather(*(self._send(to, body) for to, body in messages))
+
+    async def _send(self, to, body):
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                await self._limiter.wait()
+                try:
+                    await self.send(to, body)
+                    self.sent += 1
+                    return
+                except Exception as e:
+                    status = getattr(e, 'status', None)
+                    if status is not None and status not in RETRY_STATUSES:
+                        break
+                    if attempt < self.retries:
+                        await asyncio.sleep(self.backoff * 2 ** attempt)
+            self.failed += 1
+            logger.warning("Gave up texting %s", to)
+
+
+def twilio_sender(account_sid, auth_token, from_number, base_url=None):
+    """Return an async send(to, body) that posts through the twilio client.
+
+    base_url replaces https://api.twilio.com, e.g. to point at the local
+    fake started with `python notifications.py fake-twilio`.
+    """
+    from twilio.http.async_http_client import AsyncTwilioHttpClient
+    from twilio.rest import Client
+
+    clients = []
+
+    async def send(to, body):
+        # The client's aiohttp session has to be created on the loop that uses it
+        if not clients:
+            client = Client(account_sid, auth_token, http_client=AsyncTwilioHttpClient())
+            if base_url:
+                client.api.base_url = base_url
+            clients.append(client)
+        await clients[0].messages.create_async(to=to, from_=from_number, body=body)
+    return send
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def start_notifications(store):
+    """Start texting roster changes on store's writes if Twilio is configured, once per process.
+
+    Reads TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM_NUMBER and the
+    optional TWILIO_BASE_URL. Returns the ShiftNotifier, or None when the
+    credentials are not set.
+    """
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            settings = [os.environ.get(name) for name in
+                        ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_FROM_NUMBER')]
+            if not all(settings):
+                return None
+            send = twilio_sender(*settings, base_url=os.environ.get('TWILIO_BASE_URL'))
+            _notifier = ShiftNotifier(send, store)
+            store.on_commit(_notifier.notify)
+        return _notifier
+
+
+def run_fake_twilio(port=8099, fail_every=0):
+    """Serve a stand-in for Twilio's Messages endpoint that prints each message.
+
+    With fail_every=N, every Nth request is answered with a 429 so the
+    retry path can be exercised.
+    """
+    from aiohttp import web
+
+    requests = [0]
+
+    async def create_message(request):
+        requests[0] += 1
+        if fail_every and requests[0] % fail_every == 0:
+            return web.json_response({'code': 20429, 'message': "Too Many Requests"}, status=429)
+        form = await request.post()
+        print(f"To {form['To']} from {form['From']}:\n{form['Body']}\n", flush=True)
+        return web.json_response({
+            'sid': f"SM{requests[0]:032d}",
+            'account_sid': request.match_info['sid'],
+            'to': form['To'],
+            'from': form['From'],
+            'body': form['Body'],
+            'status': 'queued',
+        }, status=201)
+
+    app = web.Application()
+    app.add_routes([web.post('/2010-04-01/Accounts/{sid}/Messages.json', create_message)])
+    web.run_app(app, port=port)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['fake-twilio']:
+        run_fake_twilio(*(int(arg) for arg in sys.argv[2:4]))
+    else:
+        sys.exit('usage: python notifications.py fake-twilio [port] [fail_every]')
@@ -0,0 +1,56 @@
+from array import array
+
+
+class StaffRegistry:
+    """Immutable, column-oriented snapshot of the staff table with O(1) lookups.
+
+    Ids are held in a compact integer array and names and roles in parallel
+    lists, in staff table order. Dicts map each id to its position and each
+    name (ignoring case and surrounding spaces) to the ids of everyone with
+    that name. last_id is the highest id ever allocated, including removed
+    staff, so next_id never reuses one.
+    """
+
+    __slots__ = ('ids', 'names', 'roles', 'last_id', '_position', '_ids_by_name')
+
+    def __init__(self, ids, names, roles, last_id=0):
+        self.ids = array('q', ids)
+        self.names = list(names)
+        self.roles = list(roles)
+        self.last_id = max([last_id, *self.ids])
+        self._position = {staff_id: i for i, staff_id in enumerate(self.ids)}
+        self._ids_by_name = {}
+        for staff_id, name in zip(self.ids, self.names):
+            self._ids_by_name.setdefault(self._name_key(name), []).append(staff_id)
+
+    @classmethod
+    def from_frame(cls, staff_df, last_id=0):
+        return cls(staff_df['id'].astype(int), staff_df['name'].astype(str),
+                   staff_df['role'].astype(str), last_id)
+
+    @staticmethod
+    def _name_key(name):
+        return str(name).strip().lower()
+
+    @property
+    def next_id(self):
+        return self.last_id + 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, staff_id):
+        return int(staff_id) in self._position
+
+    def ids_of(self, name):
+        """Return the ids of every staff member called name."""
+        return self._ids_by_name.get(self._name_key(name), [])
+
+    def id_of(self, name):
+        """Return the id of the staff member called name, or None if no one or several are."""
+        ids = self.ids_of(name)
+        return ids[0] if len(ids) == 1 else None
+
+    def name_of(self, staff_id, default=None):
+        i = self._position.get(int(staff_id))
+        return default if i is None else self.names[i]
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+SHIFT_PATTERN = r'^\s*(\d{1,2})[:.](\d{2})\s*-\s*(\d{1,2})[:.](\d{2})\s*$'
+
+STAFF_CONFLICT = "This staff member already has a shift that overlaps with this time slot!"
+LOCATION_CONFLICT = "This location is already assigned to another staff member for this time slot!"
+
+# Locations that hold one person at a time; any other location (the office,
+# breaks) can be shared by several people at once
+EXCLUSIVE_LOCATIONS = frozenset({"Reception desk 1", "Reception desk 2", "Reception backup"})
+
+
+def shift_minutes(shift_types):
+    """Parse "HH:MM-HH:MM" strings into int32 start/end minute arrays.
+
+    Shift types that are not a time range (e.g. "Morning") get -1 for both
+    ends, which never overlaps anything.
+    """
+    parts = pd.Series(shift_types, dtype=object).astype(str).str.extract(SHIFT_PATTERN)
+    valid = parts.notna().all(axis=1).to_numpy()
+    values = parts.fillna('0').astype(np.int32).to_numpy()
+    start = np.where(valid, values[:, 0] * 60 + values[:, 1], -1).astype(np.int32)
+    end = np.where(valid, values[:, 2] * 60 + values[:, 3], -1).astype(np.int32)
+    return start, end
+
+
+def with_minutes(shifts_df):
+    """Return shifts_df with start_min/end_min columns, parsing only if missing."""
+    if 'start_min' in shifts_df and 'end_min' in shifts_df:
+        return shifts_df
+    start, end = shift_minutes(shifts_df['shift_type'])
+    return shifts_df.assign(start_min=start, end_min=end)
+
+
+def _overlapping_pairs(left, right, keys):
+    pairs = left.merge(right, on=keys, suffixes=('', '_other'))
+    overlap = (
+        (pairs['start_min'].to_numpy() < pairs['end_min_other'].to_numpy())
+        & (pairs['end_min'].to_numpy() > pairs['start_min_other'].to_numpy())
+    )
+    return pairs, overlap
+
+
+def find_conflicts(new_shifts, existing_shifts, exclusive_locations=EXCLUSIVE_LOCATIONS):
+    """Return the conflict message for each row of new_shifts, or None if it is clear.
+
+    A row conflicts when its staff member already works an overlapping time
+    that day, or when its location is one of exclusive_locations and is
+    taken for an overlapping time (or the same non-time shift type). Rows in
+    new_shifts are also checked against the rows before them, so a batch
+    never conflicts with itself.
+    """
+    new = with_minutes(new_shifts).reset_index(drop=True).assign(_row=lambda df: df.index)
+    existing = with_minutes(existing_shifts).assign(_row=-1)
+    columns = ['date', 'staff_id', 'shift_type', 'location', 'start_min', 'end_min', '_row']
+    candidates = pd.concat([existing[columns], new[columns]], ignore_index=True)
+    reasons = pd.Series([None] * len(new), dtype=object)
+
+    # Staff overlaps are checked last so their message wins, as in add_shift
+    exclusive = new['location'].isin(exclusive_locations)
+    checks = (
+        (['date', 'location'], LOCATION_CONFLICT, True, new[exclusive]),
+        (['date', 'staff_id'], STAFF_CONFLICT, False, new),
+    )
+    for keys, message, same_type_clashes, rows in checks:
+        pairs, clash = _overlapping_pairs(rows[columns], candidates, keys)
+        if same_type_clashes:
+            clash |= (
+                (pairs['shift_type'].to_numpy() == pairs['shift_type_other'].to_numpy())
+                & (pairs['start_min'].to_numpy() < 0)
+            )
+        clash &= pairs['_row_other'].to_numpy() < pairs['_row'].to_numpy()
+        reasons[np.unique(pairs['_row'].to_numpy()[clash])] = message
+    return reasons
+
+
+def staff_labels(staff_df):
+    """Return a unique column label per staff member: the name, plus the id if it is shared."""
+    names = staff_df['name'].astype(str)
+    shared = names.duplicated(keep=False)
+    return names.where(~shared, names + ' (#' + staff_df['id'].astype(str) + ')').tolist()
+
+
+def build_schedule_grids(shifts_df, staff_df, dates, locations):
+    """Build the location x staff schedule table for each date in one groupby.
+
+    Returns a dict mapping each 'YYYY-MM-DD' date string to a DataFrame with
+    a 'Location' column followed by one column per staff member (labelled by
+    staff_labels), where each cell joins that person's shift times at that
+    location.
+    """
+    shifts_df = shifts_df[shifts_df['date'].isin(dates) & shifts_df['location'].isin(locations)]
+    # Typed (categorical) frames are cast back to strings so the cells can be joined and filled
+    shifts_df = shifts_df.astype({'date': str, 'location': str, 'shift_type': str})
+    cells = (
+        shifts_df.groupby(['date', 'location', 'staff_id'], sort=False)['shift_type']
+        .agg(', '.join)
+        .unstack('staff_id')
+        .reindex(
+            index=pd.MultiIndex.from_product([dates, locations], names=['date', 'location']),
+            columns=staff_df['id']
+        )
+        .fillna('')
+    )
+    cells.columns = staff_labels(staff_df)
+    return {
+        date: cells.xs(date, level='date').rename_axis('Location').reset_index()
+        for date in dates
+    }
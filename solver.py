@@ -0,0 +1,293 @@
+import re
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from schedule import EXCLUSIVE_LOCATIONS, shift_minutes
+
+SLOT_MINUTES = 5
+DAY_START = 8 * 60
+DAY_END = 17 * 60
+SLOTS = (DAY_END - DAY_START) // SLOT_MINUTES
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Minutes of the day each location needs to be staffed, one person at a time
+DEFAULT_COVERAGE = {
+    "Reception desk 1": [(8 * 60 + 30, 17 * 60)],
+    "Reception desk 2": [(8 * 60 + 30, 16 * 60)],
+    "A-Team Office": [(8 * 60 + 30, 16 * 60)],
+    "Reception backup": [(8 * 60 + 30, 16 * 60)],
+}
+
+# Each person the solver rosters gets these breaks within their shifts,
+# staggered if the break location is exclusive
+DEFAULT_BREAKS = {
+    "Morning Tea break": (20, 9 * 60 + 30, 10 * 60 + 30),
+    "Lunch": (30, 12 * 60, 14 * 60),
+}
+
+# Locations that only some roles may cover, e.g. {"A-Team Office": ["Manager"]};
+# locations not listed take anyone. The app saves its own in data/location_roles.csv
+DEFAULT_LOCATION_ROLES = {}
+
+
+@dataclass
+class SolverSettings:
+    """Tuning knobs for solve_week; times are minutes since midnight."""
+    coverage: dict = field(default_factory=lambda: dict(DEFAULT_COVERAGE))
+    breaks: dict = field(default_factory=lambda: dict(DEFAULT_BREAKS))
+    location_roles: dict = field(default_factory=lambda: dict(DEFAULT_LOCATION_ROLES))
+    exclusive_locations: frozenset = EXCLUSIVE_LOCATIONS
+    weekdays: tuple = (0, 1, 2, 3, 4)
+    min_block: int = 30
+    max_block: int = 210
+    time_budget: float = 0.25
+    seed: int = 0
+
+
+def read_availability(availability_df):
+    """Turn rows of staff_id, day and hours into the availability mapping solve_week takes.
+
+    day is a weekday name for standing hours, or a "YYYY-MM-DD" date for
+    that day only; hours is a time range such as "08:30-16:00", or blank
+    for a day off. Rows that cannot be read are skipped.
+    """
+    staff_ids = pd.to_numeric(availability_df['staff_id'], errors='coerce')
+    hours = availability_df['hours'].fillna('').astype(str).str.strip()
+    starts, ends = shift_minutes(hours)
+    availability = {}
+    for staff_id, day, text, start, end in zip(staff_ids, availability_df['day'].astype(str),
+                                               hours, starts.tolist(), ends.tolist()):
+        day = day.strip()
+        if day.capitalize() in WEEKDAYS:
+            day = WEEKDAYS.index(day.capitalize())
+        elif not re.fullmatch(r'\d{4}-\d{2}-\d{2}', day):
+            continue
+        if pd.isna(staff_id) or (text and not start < end):
+            continue
+        availability.setdefault(int(staff_id), {})[day] = (start, end) if text else None
+    return availability
+
+
+def read_location_roles(roles_df):
+    """Turn rows of location and role into the {location: [roles]} mapping of location_roles."""
+    return {location: rows['role'].astype(str).tolist()
+            for location, rows in roles_df.groupby('location', sort=False)}
+
+
+def _slot(minute):
+    return (minute - DAY_START) // SLOT_MINUTES
+
+
+def _minute(slot):
+    return DAY_START + slot * SLOT_MINUTES
+
+
+def _shift_type(start_slot, end_slot):
+    start, end = _minute(start_slot), _minute(end_slot)
+    return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+
+def _free_runs(free):
+    """For each staff row, the number of consecutive free slots starting at each slot."""
+    runs = np.zeros(free.shape, dtype=np.int32)
+    run = np.zeros(free.shape[0], dtype=np.int32)
+    for slot in range(free.shape[1] - 1, -1, -1):
+        run = np.where(free[:, slot], run + 1, 0)
+        runs[:, slot] = run
+    return runs
+
+
+def _fill_coverage(roles, busy, working, occupied, blocks, settings, rng, worked):
+    """Cover each location's required window with blocks of min_block..max_block.
+
+    New blocks are appended to blocks as [person, start_slot, end_slot,
+    location]. Returns the number of slots that could not be covered.
+    """
+    min_need = settings.min_block // SLOT_MINUTES
+    max_need = settings.max_block // SLOT_MINUTES
+    runs = _free_runs(~busy)
+    uncovered = 0
+    for location, windows in settings.coverage.items():
+        taken = occupied.setdefault(location, np.zeros(SLOTS, dtype=bool))
+        allowed = settings.location_roles.get(location)
+        eligible = np.isin(roles, allowed) if allowed else np.ones(len(roles), dtype=bool)
+        for window_start, window_end in windows:
+            slot, last = _slot(window_start), _slot(window_end)
+            while slot < last:
+                if taken[slot]:
+                    slot += 1
+                    continue
+                ahead = taken[slot:last]
+                open_run = int(np.argmax(ahead)) if ahead.any() else last - slot
+                want = min(open_run, max_need)
+                candidates = np.flatnonzero(eligible & (runs[:, slot] >= min(min_need, want)))
+                if candidates.size == 0:
+                    uncovered += 1
+                    slot += 1
+                    continue
+                # Prefer whoever has worked least so far, breaking ties randomly
+                score = worked[candidates] + rng.random(candidates.size) * settings.min_block
+                person = candidates[np.argmin(score)]
+                length = int(min(want, runs[person, slot]))
+                block = slice(slot, slot + length)
+                busy[person, block] = True
+                working[person, block] = True
+                taken[block] = True
+                worked[person] += length * SLOT_MINUTES
+                runs[person] = _free_runs(~busy[person:person + 1])[0]
+                blocks.append([person, slot, slot + length, location])
+                slot += length
+    return uncovered
+
+
+def _place_breaks(busy, working, occupied, blocks, breaks, settings, rng, worked):
+    """Give each person rostered by the solver for at least four hours their missing breaks.
+
+    A break has to fall inside the person's worked span, with work on both
+    sides. It goes into a free gap in that span if there is one; otherwise
+    it is cut out of one of their own solver blocks, leaving pieces of at
+    least min_block, and that stretch of the block's location is reopened
+    for the next coverage pass.
+    New breaks are appended to breaks as (person, start_slot, end_slot,
+    location). Returns the number of breaks placed.
+    """
+    min_need = settings.min_block // SLOT_MINUTES
+    given = {(person, location) for person, _, _, location in breaks}
+    placed_count = 0
+    rostered = []
+    for person in sorted({block[0] for block in blocks}):
+        worked_slots = np.flatnonzero(working[person])
+        if (worked_slots[-1] + 1 - worked_slots[0]) * SLOT_MINUTES >= 4 * 60:
+            rostered.append((person, worked_slots[0], worked_slots[-1] + 1))
+
+    for location, (length, earliest, latest) in settings.breaks.items():
+        need = length // SLOT_MINUTES
+        taken = occupied.setdefault(location, np.zeros(SLOTS, dtype=bool))
+        exclusive = location in settings.exclusive_locations
+        for i in rng.permutation(len(rostered)):
+            person, first, last = rostered[i]
+            if (person, location) in given:
+                continue
+            starts = [
+                start for start in range(max(_slot(earliest), first + 1),
+                                         min(_slot(latest), last - 1) - need + 1)
+                if not (exclusive and taken[start:start + need].any())
+            ]
+            placed = next((start for start in starts if not busy[person, start:start + need].any()),
+                          None)
+            for start in starts if placed is None else ():
+                block = next((block for block in blocks if block[0] == person
+                              and block[1] <= start and start + need <= block[2]), None)
+                pieces = (start - block[1], block[2] - start - need) if block else ()
+                if block and all(piece == 0 or piece >= min_need for piece in pieces):
+                    blocks.remove(block)
+                    blocks.extend([person, a, b, block[3]] for a, b in
+                                  ((block[1], start), (start + need, block[2])) if b > a)
+                    occupied[block[3]][start:start + need] = False
+                    working[person, start:start + need] = False
+                    worked[person] -= need * SLOT_MINUTES
+                    placed = start
+                    break
+            if placed is None:
+                continue
+            busy[person, placed:placed + need] = True
+            taken[placed:placed + need] = True
+            breaks.append((person, placed, placed + need, location))
+            placed_count += 1
+    return placed_count
+
+
+def _solve_day(date_str, staff_ids, roles, busy, working, occupied, settings, rng, worked):
+    """Greedily fill one day, updating busy/working (staff x slot) and occupied (location -> slots).
+
+    Coverage is filled first and breaks are then placed inside the rostered
+    people's shifts. Another coverage pass fills the gaps the breaks opened
+    up, which can roster more people, so the two alternate until every
+    rostered person has their breaks.
+    """
+    blocks, breaks = [], []
+    uncovered = _fill_coverage(roles, busy, working, occupied, blocks, settings, rng, worked)
+    while _place_breaks(busy, working, occupied, blocks, breaks, settings, rng, worked):
+        uncovered = _fill_coverage(roles, busy, working, occupied, blocks, settings, rng, worked)
+    shifts = [(date_str, staff_ids[person], _shift_type(start, end), location)
+              for person, start, end, location in sorted(blocks + breaks, key=lambda b: b[1])]
+    return shifts, uncovered
+
+
+def solve_week(week_dates, staff_df, existing_shifts=None, availability=None, settings=None):
+    """Build a conflict-free roster for the given dates.
+
+    staff_df is the staff table (id, name, role); settings.location_roles
+    limits which roles may cover a location. availability maps a staff id to
+    {weekday or "YYYY-MM-DD": (start_minute, end_minute) or None for a day
+    off}, see read_availability; a date entry wins over the weekday, and
+    staff without either are available 08:00-17:00. Only dates on
+    settings.weekdays are filled.
+    Existing shifts (a frame with start_min/end_min, see
+    ShiftStore.shifts_frame) are kept and worked around. settings.breaks
+    are given only to people the solver rosters, inside their worked span.
+    The greedy fill is re-run with different random tie-breaks until
+    settings.time_budget seconds have passed, keeping the roster that
+    leaves the fewest uncovered minutes and spreads hours most evenly.
+
+    Returns (shifts_df, uncovered_minutes).
+    """
+    settings = settings or SolverSettings()
+    availability = availability or {}
+    staff_ids = staff_df['id'].astype(int).to_numpy()
+    roles = staff_df['role'].to_numpy()
+    week_dates = [date for date in week_dates if date.weekday() in settings.weekdays]
+    date_strs = [date.strftime('%Y-%m-%d') for date in week_dates]
+    if existing_shifts is None:
+        existing_shifts = pd.DataFrame(columns=['date', 'staff_id', 'location',
+                                                'start_min', 'end_min'])
+
+    # Base busy/working/occupied masks per day from availability and existing shifts
+    row_of = {staff_id: row for row, staff_id in enumerate(staff_ids)}
+    base = {}
+    for date, date_str in zip(week_dates, date_strs):
+        busy = np.ones((len(staff_ids), SLOTS), dtype=bool)
+        for row, staff_id in enumerate(staff_ids):
+            hours = availability.get(staff_id, {})
+            window = hours.get(date_str, hours.get(date.weekday(), (DAY_START, DAY_END)))
+            if window:
+                busy[row, max(_slot(window[0]), 0):max(_slot(window[1]), 0)] = False
+        working = np.zeros_like(busy)
+        occupied = {}
+        day_shifts = existing_shifts[existing_shifts['date'] == date_str]
+        for shift in day_shifts.itertuples():
+            if shift.start_min < 0:
+                continue
+            block = slice(max(_slot(shift.start_min), 0), max(_slot(shift.end_min), 0))
+            if shift.staff_id in row_of:
+                busy[row_of[shift.staff_id], block] = True
+                working[row_of[shift.staff_id], block] = True
+            occupied.setdefault(shift.location, np.zeros(SLOTS, dtype=bool))[block] = True
+        base[date_str] = (busy, working, occupied)
+
+    rng = np.random.default_rng(settings.seed)
+    deadline = time.perf_counter() + settings.time_budget
+    best = None
+    while best is None or time.perf_counter() < deadline:
+        worked = np.zeros(len(staff_ids), dtype=np.int64)
+        shifts, uncovered = [], 0
+        for date_str in date_strs:
+            busy, working, occupied = base[date_str]
+            day_shifts, day_uncovered = _solve_day(
+                date_str, staff_ids, roles, busy.copy(), working.copy(),
+                {location: taken.copy() for location, taken in occupied.items()},
+                settings, rng, worked
+            )
+            shifts.extend(day_shifts)
+            uncovered += day_uncovered
+        score = (uncovered, float(worked.std()))
+        if best is None or score < best[0]:
+            best = (score, shifts)
+        if uncovered == 0 and worked.std() == 0:
+            break
+
+    shifts_df = pd.DataFrame(best[1], columns=['date', 'staff_id', 'shift_type', 'location'])
+    return shifts_df, best[0][0] * SLOT_MINUTES
@@ -0,0 +1,674 @@
+import csv
+import fcntl
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count
+from schedule import shift_minutes
+
+logger = logging.getLogger(__name__)
+
+STAFF_COLUMNS = ['id', 'name', 'role']
+SHIFT_COLUMNS = ['date', 'staff_id', 'shift_type', 'location']
+
+# The process umask, read once; os.umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def replace_file(tmp_path, path):
+    """Rename tmp_path over path, giving it path's mode (or the umask default for a new file).
+
+    mkstemp creates files as 0600, which would otherwise lock out readers
+    running as other users once the first write replaced the file.
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+def atomic_write_csv(df, path):
+    """Write df to a temp file next to path and rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            df.to_csv(f, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+            count('bytes_written', os.fstat(f.fileno()).st_size)
+        replace_file(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def file_stamp(path):
+    """Return (inode, size, mtime) for path; any replace or append changes it."""
+    st = os.stat(path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def append_csv_rows(path, rows):
+    """Append rows to a CSV file with a single O_APPEND write and return the new size."""
+    needs_newline = False
+    with open(path, 'rb') as f:
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+    buffer = io.StringIO()
+    if needs_newline:
+        buffer.write('\n')
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    data = buffer.getvalue().encode()
+    count('bytes_written', len(data))
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(fd, data)
+        return os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(path, timeout=10.0):
+    """Hold an exclusive flock on path, retrying with backoff until timeout."""
+    with open(path, 'a') as f:
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for the lock on {path}")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.2)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class CsvBackend:
+    """Stores staff and shifts in data/staff.csv and data/shifts.csv.
+
+    Writers serialize on data/.roster.lock. Full rewrites go through a temp
+    file and an atomic rename and appends are a single write() call, so
+    readers never need the lock and never see a half-written file.
+    """
+
+    partitioned = False
+
+    def __init__(self, data_dir='data'):
+        self.data_dir = data_dir
+        self.staff_path = os.path.join(data_dir, 'staff.csv')
+        self.shifts_path = os.path.join(data_dir, 'shifts.csv')
+        self.lock_path = os.path.join(data_dir, '.roster.lock')
+        self.last_staff_id_path = os.path.join(data_dir, '.last_staff_id')
+        os.makedirs(data_dir, exist_ok=True)
+        with self.write_lock():
+            if not os.path.exists(self.staff_path):
+                atomic_write_csv(pd.DataFrame(columns=STAFF_COLUMNS), self.staff_path)
+            if not os.path.exists(self.shifts_path):
+                atomic_write_csv(pd.DataFrame(columns=SHIFT_COLUMNS), self.shifts_path)
+
+    def write_lock(self):
+        return file_lock(self.lock_path)
+
+    def stamp(self):
+        """Version stamp that changes whenever either file is replaced or appended to."""
+        return (file_stamp(self.staff_path), file_stamp(self.shifts_path))
+
+    def load_staff(self):
+        count('bytes_read', os.path.getsize(self.staff_path))
+        return pd.read_csv(self.staff_path)
+
+    def load_shifts(self):
+        count('bytes_read', os.path.getsize(self.shifts_path))
+        shifts_df = pd.read_csv(self.shifts_path, dtype={'date': str})
+        return list(shifts_df[SHIFT_COLUMNS].itertuples(index=False, name=None))
+
+    def save_staff(self, staff_df):
+        atomic_write_csv(staff_df, self.staff_path)
+
+    def load_last_staff_id(self):
+        """Return the highest staff id ever allocated, or 0."""
+        try:
+            with open(self.last_staff_id_path) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def save_last_staff_id(self, staff_id):
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(staff_id))
+        replace_file(tmp_path, self.last_staff_id_path)
+
+    def write_shifts(self, removed, added, all_shifts):
+        """Persist a change set; all_shifts() returns the full table after the change."""
+        if removed:
+            atomic_write_csv(pd.DataFrame(all_shifts(), columns=SHIFT_COLUMNS), self.shifts_path)
+        elif added:
+            append_csv_rows(self.shifts_path, added)
+
+
+
+class JournalBackend(CsvBackend):
+    """CsvBackend that logs shift inserts and deletes to data/shifts.journal.
+
+    shifts.csv becomes a snapshot and every change set is appended to the
+    journal as '+' and '-' records, so writes cost O(change) no matter how
+    large the history is. The journal's first line holds the SHA-1 of the
+    snapshot it applies to. Once the journal passes ROSTER_JOURNAL_LIMIT
+    bytes, a background thread folds it into a new snapshot and starts a
+    fresh journal. A journal whose hash does not match the snapshot has
+    already been folded in and is ignored, so a crash between the two
+    renames cannot apply records twice.
+    """
+
+    def __init__(self, data_dir='data', limit=None):
+        super().__init__(data_dir)
+        self.journal_path = os.path.join(data_dir, 'shifts.journal')
+        self.limit = limit or int(os.environ.get('ROSTER_JOURNAL_LIMIT', 256 * 1024))
+        self._compacting = threading.Lock()
+        with self.write_lock():
+            if not os.path.exists(self.journal_path):
+                self._start_journal(self._read_snapshot()[1])
+
+    def stamp(self):
+        return super().stamp() + (file_stamp(self.journal_path),)
+
+    def _read_snapshot(self):
+        with open(self.shifts_path, 'rb') as f:
+            data = f.read()
+        count('bytes_read', len(data))
+        shifts_df = pd.read_csv(io.BytesIO(data), dtype={'date': str})
+        records = [
+            (str(date), int(staff_id), str(shift_type), str(location))
+            for date, staff_id, shift_type, location
+            in shifts_df[SHIFT_COLUMNS].itertuples(index=False, name=None)
+        ]
+        return records, hashlib.sha1(data).hexdigest()
+
+    def _start_journal(self, snapshot_hash):
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(f"snapshot,{snapshot_hash}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        replace_file(tmp_path, self.journal_path)
+
+    def _replay(self):
+        # The journal is read before the snapshot: a compaction finishing in
+        # between leaves a stale journal, which the hash check then skips.
+        count('bytes_read', os.path.getsize(self.journal_path))
+        with open(self.journal_path, newline='') as f:
+            entries = list(csv.reader(f))
+        records, snapshot_hash = self._read_snapshot()
+        if not entries or entries[0] != ['snapshot', snapshot_hash]:
+            return records
+        rows = dict(enumerate(records))
+        positions = defaultdict(list)
+        for row_id, record in rows.items():
+            positions[record].append(row_id)
+        next_id = len(records)
+        for entry in entries[1:]:
+            if len(entry) != 5:
+                continue  # torn final line from an interrupted append
+            op, date, staff_id, shift_type, location = entry
+            record = (date, int(staff_id), shift_type, location)
+            if op == '+':
+                rows[next_id] = record
+                positions[record].append(next_id)
+                next_id += 1
+            elif positions[record]:
+                del rows[positions[record].pop(0)]
+        return list(rows.values())
+
+    def load_shifts(self):
+        return self._replay()
+
+    def write_shifts(self, removed, added, all_shifts):
+        """Append the change set to the journal and compact in the background if it is large."""
+        size = append_csv_rows(
+            self.journal_path,
+            [('-',) + tuple(record) for record in removed]
+            + [('+',) + tuple(record) for record in added]
+        )
+        if size > self.limit and self._compacting.acquire(blocking=False):
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        finally:
+            self._compacting.release()
+
+    def compact(self):
+        """Fold the journal into a new shifts.csv snapshot and start an empty journal."""
+        with self.write_lock():
+            records = self._replay()
+            atomic_write_csv(pd.DataFrame(records, columns=SHIFT_COLUMNS), self.shifts_path)
+            self._start_journal(self._read_snapshot()[1])
+
+
+class PartitionedBackend(CsvBackend):
+    """Stores shifts as one CSV per ISO week under data/shifts/, e.g. 2025-W09.csv.
+
+    The store only loads the partitions covering the dates it is asked
+    about, so startup cost and memory do not grow with history. Inserts
+    append to their week's file and deletes rewrite only the weeks they
+    touch. data/shifts/.version is bumped on every write and serves as the
+    version stamp.
+    """
+
+    partitioned = True
+    extension = 'csv'
+
+    def __init__(self, data_dir='data'):
+        super().__init__(data_dir)
+        self.partition_dir = os.path.join(data_dir, 'shifts')
+        self.version_path = os.path.join(self.partition_dir, '.version')
+        os.makedirs(self.partition_dir, exist_ok=True)
+        with self.write_lock():
+            if not os.path.exists(self.version_path):
+                self._bump_version()
+
+    @staticmethod
+    def partition_of(date_str):
+        year, week, _ = datetime.strptime(date_str, '%Y-%m-%d').isocalendar()
+        return f"{year}-W{week:02d}"
+
+    @staticmethod
+    def partition_dates(key):
+        year, week = key.split('-W')
+        return [date.fromisocalendar(int(year), int(week), day).strftime('%Y-%m-%d')
+                for day in range(1, 8)]
+
+    def _partition_path(self, key):
+        return os.path.join(self.partition_dir, f"{key}.{self.extension}")
+
+    def partitions(self):
+        suffix = f".{self.extension}"
+        return sorted(name[:-len(suffix)] for name in os.listdir(self.partition_dir)
+                      if name.endswith(suffix))
+
+    def stamp(self):
+        return (file_stamp(self.staff_path), file_stamp(self.version_path))
+
+    def _bump_version(self):
+        try:
+            with open(self.version_path) as f:
+                version = int(f.read() or 0)
+        except FileNotFoundError:
+            version = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.partition_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(version + 1))
+        replace_file(tmp_path, self.version_path)
+
+    def load_shifts(self):
+        return [record for key in self.partitions() for record in self.load_partition(key)[0]]
+
+    def load_partition(self, key):
+        """Return (records, spans) for one week; spans is None as CSV does not store the minutes."""
+        path = self._partition_path(key)
+        if not os.path.exists(path):
+            return [], None
+        return self._read_partition(path), None
+
+    def _read_partition(self, path):
+        count('bytes_read', os.path.getsize(path))
+        shifts_df = pd.read_csv(path, dtype={'date': str})
+        return list(shifts_df[SHIFT_COLUMNS].itertuples(index=False, name=None))
+
+    def _write_partition(self, path, records):
+        atomic_write_csv(pd.DataFrame(records, columns=SHIFT_COLUMNS), path)
+
+    def _append_partition(self, path, records):
+        if not os.path.exists(path):
+            self._write_partition(path, [])
+        append_csv_rows(path, records)
+
+    def write_shifts(self, removed, added, all_shifts):
+        """Rewrite the weeks that lost rows and append to the weeks that only gained rows."""
+        rewrite = {self.partition_of(record[0]) for record in removed}
+        appends = defaultdict(list)
+        for record in added:
+            appends[self.partition_of(record[0])].append(record)
+        for key in sorted(rewrite):
+            self._write_partition(self._partition_path(key), all_shifts(self.partition_dates(key)))
+        for key, records in sorted(appends.items()):
+            if key not in rewrite:
+                self._append_partition(self._partition_path(key), records)
+        self._bump_version()
+
+
+class ParquetBackend(PartitionedBackend):
+    """PartitionedBackend that stores each ISO week as a Parquet file (needs pyarrow).
+
+    Columns are typed instead of being re-parsed from text: date is date32,
+    staff_id and the start_min/end_min minute pair are int32, and shift_type
+    and location are dictionary-encoded. read_frame() serves shift tables
+    straight from these columns, with the date filter pushed down to the
+    reader and categorical columns in memory. When the store does load a
+    week into its indexes, the stored minutes come with the records so
+    nothing is parsed again. Parquet files cannot be appended to, so a write
+    rewrites the weeks it touches, which hold a week of shifts each.
+    """
+
+    extension = 'parquet'
+
+    def __init__(self, data_dir='data'):
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.pc = pyarrow.compute
+        self.ds = pyarrow.dataset
+        self.pq = pyarrow.parquet
+        self.schema = pyarrow.schema([
+            ('date', pyarrow.date32()),
+            ('staff_id', pyarrow.int32()),
+            ('shift_type', pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+            ('location', pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+            ('start_min', pyarrow.int32()),
+            ('end_min', pyarrow.int32()),
+        ])
+        super().__init__(data_dir)
+
+    def _to_table(self, records):
+        shifts_df = pd.DataFrame(records, columns=SHIFT_COLUMNS)
+        start, end = shift_minutes(shifts_df['shift_type'])
+        shifts_df = shifts_df.assign(
+            date=pd.to_datetime(shifts_df['date'], format='%Y-%m-%d').dt.date,
+            staff_id=shifts_df['staff_id'].astype('int32'),
+            shift_type=shifts_df['shift_type'].astype('category'),
+            location=shifts_df['location'].astype('category'),
+            start_min=start,
+            end_min=end,
+        )
+        return self.pa.Table.from_pandas(shifts_df, schema=self.schema, preserve_index=False)
+
+    def _read_table(self, path):
+        count('bytes_read', os.path.getsize(path))
+        return self.pq.read_table(path, schema=self.schema).unify_dictionaries().combine_chunks()
+
+    def _decoded(self, column, convert=str):
+        """Return a column as a NumPy object array, converting each distinct value only once."""
+        if not self.pa.types.is_dictionary(column.type):
+            column = self.pc.dictionary_encode(column)
+        column = column.combine_chunks()
+        values = np.array([convert(value) for value in column.dictionary.to_pylist()], dtype=object)
+        return values[column.indices.to_numpy(zero_copy_only=False)]
+
+    def _records(self, table):
+        return list(zip(
+            self._decoded(table['date'], date.isoformat).tolist(),
+            table['staff_id'].to_numpy().tolist(),
+            self._decoded(table['shift_type']).tolist(),
+            self._decoded(table['location']).tolist(),
+        ))
+
+    def _read_partition(self, path):
+        return self._records(self._read_table(path))
+
+    def load_partition(self, key):
+        """Return (records, spans) for one week, with the stored start/end minute arrays."""
+        path = self._partition_path(key)
+        if not os.path.exists(path):
+            return [], None
+        table = self._read_table(path)
+        return self._records(table), (table['start_min'].to_numpy(), table['end_min'].to_numpy())
+
+    def read_frame(self, dates=None, minutes=False):
+        """Return the shifts on the given date strings (or all shifts) as a typed, columnar frame.
+
+        Only the weeks covering dates are opened and the date filter is
+        pushed down to the Parquet reader. date, shift_type and location come
+        back as categoricals and staff_id (and start_min/end_min, with
+        minutes=True) as int32, without building a Python object per row.
+        """
+        keys = set(self.partitions())
+        if dates is not None:
+            keys &= {self.partition_of(day) for day in dates}
+        paths = [self._partition_path(key) for key in sorted(keys)]
+        for path in paths:
+            count('bytes_read', os.path.getsize(path))
+        columns = SHIFT_COLUMNS + (['start_min', 'end_min'] if minutes else [])
+        dataset = self.ds.dataset(paths, schema=self.schema, format='parquet')
+        day_filter = None
+        if dates is not None:
+            days = [datetime.strptime(day, '%Y-%m-%d').date() for day in dates]
+            day_filter = self.ds.field('date').isin(days)
+        table = dataset.to_table(columns=columns, filter=day_filter)
+        table = table.set_column(
+            0, 'date', self.pc.dictionary_encode(table['date'].cast(self.pa.string()))
+        )
+        return table.to_pandas()
+
+    def _write_partition(self, path, records):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            self.pq.write_table(self._to_table(records), tmp_path)
+            count('bytes_written', os.path.getsize(tmp_path))
+            replace_file(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _append_partition(self, path, records):
+        existing = self._read_partition(path) if os.path.exists(path) else []
+        self._write_partition(path, existing + list(records))
+
+
+class SqliteBackend:
+    """Stores staff and shifts in an indexed SQLite database running in WAL mode."""
+
+    partitioned = False
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS staff (
+            id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            role TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS shifts (
+            date TEXT NOT NULL,
+            staff_id INTEGER NOT NULL,
+            shift_type TEXT NOT NULL,
+            location TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_shifts_date ON shifts (date);
+        CREATE INDEX IF NOT EXISTS idx_shifts_staff_date ON shifts (staff_id, date);
+        CREATE INDEX IF NOT EXISTS idx_shifts_location_date ON shifts (location, date);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, db_path='data/roster.db'):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        # Added as an index so databases created before staff ids were unique get it too
+        try:
+            self.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_staff_id ON staff (id)')
+        except sqlite3.IntegrityError:
+            logger.warning("%s has duplicate staff ids; staff ids are not enforced unique "
+                           "until they are fixed", db_path)
+
+    @contextmanager
+    def write_lock(self):
+        """Hold SQLite's write lock (BEGIN IMMEDIATE) until the block commits."""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.conn.rollback()
+            raise
+        else:
+            self.conn.commit()
+
+    def stamp(self):
+        """Version stamp that changes whenever another connection commits."""
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def load_staff(self):
+        return pd.read_sql_query('SELECT id, name, role FROM staff ORDER BY rowid', self.conn)
+
+    def load_shifts(self):
+        return self.conn.execute(
+            'SELECT date, staff_id, shift_type, location FROM shifts ORDER BY rowid'
+        ).fetchall()
+
+    def save_staff(self, staff_df):
+        """Replace the staff table; runs inside write_lock()'s transaction."""
+        self.conn.execute('DELETE FROM staff')
+        self.conn.executemany(
+            'INSERT INTO staff (id, name, role) VALUES (?, ?, ?)',
+            [(int(row.id), row.name, row.role) for row in staff_df.itertuples()]
+        )
+
+    def load_last_staff_id(self):
+        """Return the highest staff id ever allocated, or 0."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_staff_id'").fetchone()
+        return row[0] if row else 0
+
+    def save_last_staff_id(self, staff_id):
+        """Record the staff id high-water mark; runs inside write_lock()'s transaction."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_staff_id', ?)", (int(staff_id),)
+        )
+
+    def write_shifts(self, removed, added, all_shifts):
+        """Persist a change set as indexed single-row deletes and inserts."""
+        self.conn.executemany(
+            'DELETE FROM shifts WHERE rowid = ('
+            ' SELECT rowid FROM shifts'
+            ' WHERE date = ? AND staff_id = ? AND shift_type = ? AND location = ?'
+            ' LIMIT 1)',
+            removed
+        )
+        self.conn.executemany(
+            'INSERT INTO shifts (date, staff_id, shift_type, location) VALUES (?, ?, ?, ?)',
+            added
+        )
+
+
+def open_backend(data_dir='data'):
+    """Return the backend named by ROSTER_BACKEND.
+
+    One of 'csv' (the default), 'journal', 'partitioned', 'parquet' or 'sqlite'.
+    """
+    kind = os.environ.get('ROSTER_BACKEND', 'csv')
+    if kind == 'csv':
+        return CsvBackend(data_dir)
+    if kind == 'journal':
+        return JournalBackend(data_dir)
+    if kind == 'partitioned':
+        return PartitionedBackend(data_dir)
+    if kind == 'parquet':
+        return ParquetBackend(data_dir)
+    if kind == 'sqlite':
+        return SqliteBackend(os.environ.get('ROSTER_DB', os.path.join(data_dir, 'roster.db')))
+    raise ValueError(f"Unknown ROSTER_BACKEND: {kind}")
+
+
+def migrate_csv_to_sqlite(data_dir='data', db_path=None, renumber=False):
+    """Copy staff.csv and shifts.csv into an SQLite database, replacing its contents.
+
+    The database keeps staff ids unique, so ids repeated in staff.csv raise
+    a ValueError naming them, before anything is written. With renumber=True
+    each repeat after the first gets a fresh id above the high-water mark
+    instead; its shifts stay with the first holder, as nothing in
+    shifts.csv tells the two apart.
+    """
+    source = CsvBackend(data_dir)
+    staff_df = source.load_staff()
+    last_id = max([source.load_last_staff_id(), *staff_df['id'].astype(int)])
+    repeats = staff_df['id'].duplicated()
+    if repeats.any() and not renumber:
+        listing = ', '.join(f"{row.id} ({row.name})" for row in
+                            staff_df[staff_df['id'].duplicated(keep=False)].itertuples())
+        raise ValueError(f"staff.csv repeats staff ids: {listing}. Give each person their own "
+                         "id, or migrate with renumber to assign new ids to the repeats")
+    if repeats.any():
+        staff_df = staff_df.copy()
+        staff_df.loc[repeats, 'id'] = range(last_id + 1, last_id + 1 + int(repeats.sum()))
+        last_id += int(repeats.sum())
+    target = SqliteBackend(db_path or os.path.join(data_dir, 'roster.db'))
+    shifts = [
+        (str(date), int(staff_id), str(shift_type), str(location))
+        for date, staff_id, shift_type, location in source.load_shifts()
+    ]
+    with target.write_lock():
+        target.conn.execute('DELETE FROM shifts')
+        target.save_staff(staff_df)
+        target.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_staff_id ON staff (id)')
+        target.save_last_staff_id(last_id)
+        target.write_shifts([], shifts, None)
+    return len(staff_df), len(shifts)
+
+
+def migrate_csv_to_partitions(data_dir='data', file_format='csv'):
+    """Split shifts.csv into weekly CSV or Parquet partitions, replacing existing ones."""
+    source = CsvBackend(data_dir)
+    target = ParquetBackend(data_dir) if file_format == 'parquet' else PartitionedBackend(data_dir)
+    shifts_df = pd.read_csv(source.shifts_path, dtype={'date': str})
+    with target.write_lock():
+        for key in target.partitions():
+            os.unlink(target._partition_path(key))
+        weeks = shifts_df['date'].map(target.partition_of)
+        for key, week_df in shifts_df.groupby(weeks):
+            target._write_partition(
+                target._partition_path(key),
+                list(week_df[SHIFT_COLUMNS].itertuples(index=False, name=None))
+            )
+        target._bump_version()
+    return weeks.nunique(), len(shifts_df)
+
+
+if __name__ == '__main__':
+    command = sys.argv[1:2]
+    if command == ['migrate']:
+        args = [arg for arg in sys.argv[2:] if arg != '--renumber']
+        try:
+            staff_count, shift_count = migrate_csv_to_sqlite(*args[:2],
+                                                             renumber='--renumber' in sys.argv)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"Migrated {staff_count} staff and {shift_count} shifts")
+    elif command == ['partition']:
+        week_count, shift_count = migrate_csv_to_partitions(*sys.argv[2:4])
+        print(f"Split {shift_count} shifts into {week_count} weekly partitions")
+    else:
+        sys.exit('usage: python storage.py migrate [data_dir] [db_path] [--renumber]\n'
+                 '       python storage.py partition [data_dir] [csv|parquet]')
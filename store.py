@@ -0,0 +1,362 @@
+import threading
+from collections import defaultdict, namedtuple
+from itertools import count
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from registry import StaffRegistry
+from schedule import shift_minutes
+from storage import SHIFT_COLUMNS, open_backend
+
+Change = namedtuple('Change', ['remove', 'add', 'staff'], defaults=((), (), None))
+Change.__doc__ = "Row ids to delete, shift records to insert and an optional new staff table."
+
+
+class ShiftStore:
+    """Process-wide copy of the staff and shift tables with hash indexes over the shifts.
+
+    Shifts are kept as (date, staff_id, shift_type, location) tuples keyed by an
+    internal row id and indexed by date, by (staff_id, date) and by
+    (date, location), so lookups never scan the full history. The start and
+    end minute of each shift are parsed once, when it enters the store, and
+    kept alongside the record for interval checks, or taken from the
+    backend when it stores them. Every mutation goes through apply(), which
+    hands the backend a change set rather than a full table. Listeners
+    registered with subscribe() see every row as it enters or leaves the
+    indexes. Backends with a typed read_frame() (Parquet) serve
+    shifts_frame() directly, so table reads do not load weeks into the
+    indexes at all.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.version = 0
+        self._lock = threading.RLock()
+        self._writer = threading.Lock()
+        self._loaded = set()
+        self._listeners = []
+        self._commit_hooks = []
+        self.load()
+
+    def load(self):
+        """(Re)load both tables from the backend and rebuild the indexes."""
+        with self._lock, instrumentation.span('store.load'):
+            self._stamp = self.backend.stamp()
+            self.staff_df = self.backend.load_staff()
+            last_id = self.backend.load_last_staff_id()
+            self.registry = StaffRegistry.from_frame(self.staff_df, last_id)
+            instrumentation.count('rows_read', len(self.staff_df))
+            self._rows = {}
+            self._spans = {}
+            self._by_date = defaultdict(set)
+            self._by_staff_date = defaultdict(set)
+            self._by_date_location = defaultdict(set)
+            self._next_id = count()
+            self._loaded = set()
+            for listener in self._listeners:
+                listener.reset()
+            if not self.backend.partitioned:
+                records = [self._normalize(record) for record in self.backend.load_shifts()]
+                instrumentation.count('rows_read', len(records))
+                self._insert_all(records)
+            self.version += 1
+
+    def refresh(self):
+        """Reload if another process has written since this store last synced."""
+        with self._lock:
+            if self.backend.stamp() != self._stamp:
+                self.load()
+
+    def _ensure_dates(self, dates):
+        """Load the backend partitions covering the given date strings, if not loaded yet."""
+        if self.backend.partitioned:
+            self._ensure_partitions({self.backend.partition_of(date) for date in dates})
+
+    def _ensure_all(self):
+        if self.backend.partitioned:
+            self._ensure_partitions(self.backend.partitions())
+
+    def _ensure_partitions(self, keys):
+        for key in sorted(set(keys) - self._loaded):
+            with instrumentation.span('store.load_partition'):
+                records, spans = self.backend.load_partition(key)
+                records = [self._normalize(record) for record in records]
+                instrumentation.count('rows_read', len(records))
+                self._insert_all(records, spans)
+            self._loaded.add(key)
+
+    @staticmethod
+    def _normalize(record):
+        date, staff_id, shift_type, location = record
+        return (str(date), int(staff_id), str(shift_type), str(location))
+
+    def _insert_all(self, records, spans=None):
+        if spans is None:
+            spans = shift_minutes([record[2] for record in records])
+        starts, ends = spans
+        for record, start, end in zip(records, starts.tolist(), ends.tolist()):
+            self._insert(record, (start, end))
+
+    def _insert(self, record, span):
+        row_id = next(self._next_id)
+        date, staff_id, _, location = record
+        self._rows[row_id] = record
+        self._spans[row_id] = span
+        self._by_date[date].add(row_id)
+        self._by_staff_date[(staff_id, date)].add(row_id)
+        self._by_date_location[(date, location)].add(row_id)
+        for listener in self._listeners:
+            listener.added(record, span)
+        return row_id
+
+    def _delete(self, row_id):
+        record = self._rows.pop(row_id)
+        span = self._spans.pop(row_id)
+        for listener in self._listeners:
+            listener.removed(record, span)
+        date, staff_id, _, location = record
+        for index, key in ((self._by_date, date),
+                           (self._by_staff_date, (staff_id, date)),
+                           (self._by_date_location, (date, location))):
+            index[key].discard(row_id)
+            if not index[key]:
+                del index[key]
+        return record
+
+    def subscribe(self, listener):
+        """Keep listener in step with the loaded shifts.
+
+        listener needs added(record, span), removed(record, span) and reset()
+        methods. They are called under the store lock, first with every row
+        already loaded, then as rows are inserted, deleted or reloaded.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+            listener.reset()
+            for row_id, record in self._rows.items():
+                listener.added(record, self._spans[row_id])
+
+    def on_commit(self, hook):
+        """Call hook(removed, added) with the shift records of every change this store writes.
+
+        Hooks run under the store lock right after the write, so they should
+        only hand the records off.
+        """
+        with self._lock:
+            self._commit_hooks.append(hook)
+
+    def preload(self, dates=None):
+        """Load the shifts on the given date strings (or all shifts) from a partitioned backend."""
+        with self._lock:
+            if dates is None:
+                self._ensure_all()
+            else:
+                self._ensure_dates(dates)
+
+    # Queries
+
+    def find(self, date=None, staff_id=None, location=None):
+        """Return the row ids matching the given filters, using the narrowest index."""
+        with self._lock:
+            if date is None:
+                self._ensure_all()
+            else:
+                self._ensure_dates([date])
+            if date is not None and staff_id is not None:
+                ids = self._by_staff_date.get((int(staff_id), date), set())
+            elif date is not None and location is not None:
+                ids = self._by_date_location.get((date, location), set())
+            elif date is not None:
+                ids = self._by_date.get(date, set())
+            else:
+                ids = self._rows.keys()
+            return [
+                row_id for row_id in ids
+                if (staff_id is None or self._rows[row_id][1] == int(staff_id))
+                and (location is None or self._rows[row_id][3] == location)
+            ]
+
+    def _records(self, dates=None):
+        """Return the loaded records, optionally only those on the given date strings."""
+        if dates is None:
+            return list(self._rows.values())
+        return [self._rows[row_id] for date in dates for row_id in self._by_date.get(date, ())]
+
+    def shifts(self, date=None, staff_id=None, location=None):
+        """Return the shift records matching the given filters."""
+        with self._lock:
+            return [self._rows[row_id] for row_id in self.find(date, staff_id, location)]
+
+    def shifts_frame(self, dates=None, minutes=False):
+        """Return the shifts, optionally limited to the given date strings, as a DataFrame.
+
+        With minutes=True the frame also carries the pre-parsed start_min and
+        end_min columns. With a typed backend the frame is read from disk,
+        with categorical date, shift_type and location columns.
+        """
+        with self._lock:
+            if hasattr(self.backend, 'read_frame'):
+                shifts_df = self.backend.read_frame(dates, minutes)
+                instrumentation.count('rows_read', len(shifts_df))
+                return shifts_df
+            if dates is None:
+                self._ensure_all()
+                row_ids = list(self._rows)
+            else:
+                self._ensure_dates(dates)
+                row_ids = [row_id for date in dates for row_id in self._by_date.get(date, ())]
+            shifts_df = pd.DataFrame([self._rows[row_id] for row_id in row_ids],
+                                     columns=SHIFT_COLUMNS)
+            if minutes:
+                spans = np.array([self._spans[row_id] for row_id in row_ids],
+                                 dtype=np.int32).reshape(-1, 2)
+                shifts_df['start_min'] = spans[:, 0]
+                shifts_df['end_min'] = spans[:, 1]
+        return shifts_df
+
+    def staff_registry(self):
+        """Return the current StaffRegistry; it is replaced, never changed, on writes."""
+        with self._lock:
+            return self.registry
+
+    def staff_frame(self):
+        """Return a copy of the staff table."""
+        with self._lock:
+            return self.staff_df.copy()
+
+    # Mutations
+
+    def apply(self, plan):
+        """Apply the Change returned by plan() as one locked write.
+
+        plan() reads the in-memory tables and returns a Change, or None when
+        there is nothing to do. Writers in this process take turns, then
+        wait for the backend's write lock without holding the store lock, so
+        readers are never stuck behind a writer waiting on another process.
+        The store lock is only taken again to commit. If another process
+        wrote in the meantime the store reloads first, and plan() runs again
+        if anything changed, so the change is always computed against the
+        latest data. Returns False if plan() returned None, True once the
+        change is written. If the write fails, the store reloads once the
+        backend has released its lock (and rolled back, for SQLite), so
+        memory matches what was actually persisted.
+        """
+        with self._lock:
+            version = self.version
+            change = plan()
+        if change is None:
+            return False
+        with self._writer:
+            try:
+                with self.backend.write_lock(), self._lock:
+                    if self.backend.stamp() != self._stamp:
+                        self.load()
+                    if self.version != version:
+                        change = plan()
+                        if change is None:
+                            return False
+                    self._commit(change)
+            except Exception:
+                self.load()
+                raise
+            return True
+
+    def _commit(self, change):
+        records = [self._normalize(record) for record in change.add]
+        self._ensure_dates({record[0] for record in records})
+        removed = [self._delete(row_id) for row_id in change.remove]
+        self._insert_all(records)
+        with instrumentation.span('store.write'):
+            if change.staff is not None:
+                self.staff_df = change.staff.reset_index(drop=True)
+                self.backend.save_staff(self.staff_df)
+                registry = StaffRegistry.from_frame(self.staff_df, self.registry.last_id)
+                if registry.last_id > self.registry.last_id:
+                    self.backend.save_last_staff_id(registry.last_id)
+                self.registry = registry
+                instrumentation.count('rows_written', len(self.staff_df))
+            if removed or records:
+                self.backend.write_shifts(removed, records, self._records)
+                instrumentation.count('rows_written', len(removed) + len(records))
+        self._stamp = self.backend.stamp()
+        self.version += 1
+        if removed or records:
+            for hook in self._commit_hooks:
+                hook(removed, records)
+
+    def add_shifts(self, records):
+        """Insert shift records."""
+        records = list(records)
+        return self.apply(lambda: Change(add=records) if records else None)
+
+    def remove_where(self, date=None, staff_id=None, location=None):
+        """Delete the shifts matching the given filters."""
+        return self.apply(lambda: Change(remove=self.find(date, staff_id, location)))
+
+    def remove_shifts(self, records):
+        """Delete the shifts matching the given (date, staff_id, shift_type, location) records."""
+        records = [self._normalize(record) for record in records]
+
+        def plan():
+            row_ids = [
+                row_id for date, staff_id, shift_type, location in records
+                for row_id in self.find(date, staff_id, location)
+                if self._rows[row_id][2] == shift_type
+            ]
+            return Change(remove=row_ids) if row_ids else None
+        return self.apply(plan)
+
+    def add_staff(self, name, role):
+        """Add a staff member under the next unused id and return that id."""
+        new_ids = []
+
+        def plan():
+            new_ids[:] = [self.registry.next_id]
+            new_staff = pd.DataFrame([{'id': new_ids[0], 'name': name, 'role': role}])
+            return Change(staff=pd.concat([self.staff_df, new_staff], ignore_index=True))
+        self.apply(plan)
+        return new_ids[0]
+
+    def update_staff_role(self, staff_id, role):
+        def plan():
+            staff_df = self.staff_df.copy()
+            staff_df.loc[staff_df['id'] == staff_id, 'role'] = role
+            return Change(staff=staff_df)
+        return self.apply(plan)
+
+    def remove_staff(self, staff_id):
+        """Remove a staff member and all of their shifts."""
+        staff_id = int(staff_id)
+        return self.apply(lambda: Change(
+            remove=self.find(staff_id=staff_id),
+            staff=self.staff_df[self.staff_df['id'] != staff_id]
+        ))
+
+    def edit_staff(self, roles, removed):
+        """Set the roles in a {staff_id: role} dict and remove the staff in removed in one write."""
+        removed = {int(staff_id) for staff_id in removed}
+
+        def plan():
+            if not roles and not removed:
+                return None
+            staff_df = self.staff_df[~self.staff_df['id'].isin(removed)].copy()
+            for staff_id, role in roles.items():
+                staff_df.loc[staff_df['id'] == int(staff_id), 'role'] = role
+            row_ids = [row_id for row_id in self.find() if self._rows[row_id][1] in removed]
+            return Change(remove=row_ids, staff=staff_df)
+        return self.apply(plan)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(data_dir='data'):
+    """Return the process-wide ShiftStore, opening the configured backend on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ShiftStore(open_backend(data_dir))
+        return _store
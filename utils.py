@@ -1,193 +1,419 @@
+import os
+
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import timedelta
 import streamlit as st
+from analytics import get_coverage
+from exporter import export_chunks, write_csv, write_xlsx
+from importer import read_shifts, read_staff_hours
+from instrumentation import timed
+from notifications import start_notifications
+from schedule import find_conflicts, shift_minutes
+from solver import SolverSettings, read_availability, read_location_roles, solve_week
+from storage import atomic_write_csv, file_lock
+from store import Change, get_store
+
+LOCATIONS = [
+    "Reception desk 1",
+    "Reception desk 2",
+    "A-Team Office",
+    "Morning Tea break",
+    "Lunch",
+    "Reception backup"
+]
+
+ROLES = ["Manager", "Senior Staff", "Junior Staff", "Supported Employee", "Admin Assistant"]
+
+# What auto_schedule reads for staff hours (staff_id, day, hours) and role limits (location, role)
+AVAILABILITY_FILE = os.path.join('data', 'availability.csv')
+LOCATION_ROLES_FILE = os.path.join('data', 'location_roles.csv')
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _staff_table(version):
+    return get_store().staff_frame()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _shift_table(version, dates):
+    return get_store().shifts_frame(None if dates is None else list(dates))
+
+def _synced_store():
+    # A cheap stamp check that reloads if another process (e.g. api.py) has written
+    store = get_store()
+    store.refresh()
+    return store
 
+@timed
+def load_staff():
+    """Return the staff table, cached until the next write by any process."""
+    return _staff_table(_synced_store().version)
+
+@timed
+def load_shifts(dates=None):
+    """Return the shifts on the given date strings (or all shifts), cached until the next write."""
+    return _shift_table(_synced_store().version, None if dates is None else tuple(dates))
+
+@timed
+def load_registry():
+    """Return the StaffRegistry for O(1) staff lookups by id or name."""
+    return _synced_store().staff_registry()
+
+@timed
+def invalidate_cache():
+    """Drop the cached tables after a write."""
+    _staff_table.clear()
+    _shift_table.clear()
+
+@timed
+def enable_notifications():
+    """Text staff about their roster changes, if Twilio is configured."""
+    return start_notifications(get_store())
+
+@timed
 def get_week_dates(date):
     """Return list of dates for the week containing the given date."""
     start = date - timedelta(days=date.weekday())
     return [start + timedelta(days=i) for i in range(7)]
 
+@timed
 def add_staff(name, role):
-    """Add a new staff member to the staff.csv file."""
-    staff_df = pd.read_csv('data/staff.csv')
-    new_id = len(staff_df) + 1
-    new_staff = pd.DataFrame([{
-        'id': new_id,
-        'name': name,
-        'role': role
-    }])
-    staff_df = pd.concat([staff_df, new_staff], ignore_index=True)
-    staff_df.to_csv('data/staff.csv', index=False)
+    """Add a new staff member under a never-reused id and return the id."""
+    new_id = get_store().add_staff(name, role)
+    invalidate_cache()
+    return new_id
 
+@timed
 def update_staff_role(staff_id, new_role):
     """Update the role of an existing staff member."""
-    staff_df = pd.read_csv('data/staff.csv')
-    staff_df.loc[staff_df['id'] == staff_id, 'role'] = new_role
-    staff_df.to_csv('data/staff.csv', index=False)
+    get_store().update_staff_role(staff_id, new_role)
+    invalidate_cache()
 
+@timed
 def remove_staff(staff_id):
     """Remove a staff member and their associated shifts."""
-    # Remove from staff.csv
-    staff_df = pd.read_csv('data/staff.csv')
-    staff_df = staff_df[staff_df['id'] != staff_id]
-    staff_df.to_csv('data/staff.csv', index=False)
+    get_store().remove_staff(staff_id)
+    invalidate_cache()
 
-    # Remove associated shifts
-    shifts_df = pd.read_csv('data/shifts.csv')
-    shifts_df = shifts_df[shifts_df['staff_id'] != staff_id]
-    shifts_df.to_csv('data/shifts.csv', index=False)
+@timed
+def apply_staff_edits(roles, removed):
+    """Apply role changes ({staff_id: role}) and staff removals in a single write."""
+    if get_store().edit_staff(roles, removed):
+        invalidate_cache()
 
-def add_shift(staff_id, date, shift_type, location):
-    """Add a new shift to the shifts.csv file."""
-    shifts_df = pd.read_csv('data/shifts.csv')
+@timed
+def validate_shift(staff_id, shift_type, location):
+    """Return why a shift cannot be added (unknown staff or location, or a bad time), or None.
 
-    # Check for conflicts
-    date_str = date.strftime('%Y-%m-%d')
-    
-    # Check for time conflicts
-    staff_shifts = shifts_df[
-        (shifts_df['staff_id'] == staff_id) & 
-        (shifts_df['date'] == date_str)
-    ]
-    
-    if not staff_shifts.empty:
-        new_start = datetime.strptime(shift_type.split('-')[0], '%H:%M').time()
-        new_end = datetime.strptime(shift_type.split('-')[1], '%H:%M').time()
-        
-        for _, existing_shift in staff_shifts.iterrows():
-            existing_start = datetime.strptime(existing_shift['shift_type'].split('-')[0], '%H:%M').time()
-            existing_end = datetime.strptime(existing_shift['shift_type'].split('-')[1], '%H:%M').time()
-            
-            if (new_start < existing_end and new_end > existing_start):
-                st.error("This staff member already has a shift that overlaps with this time slot!")
-                return False
-        
-    # Check if location is already occupied
-    location_shifts = shifts_df[
-        (shifts_df['date'] == date_str) & 
-        (shifts_df['location'] == location) &
-        (shifts_df['shift_type'] == shift_type)
-    ]
-    if not location_shifts.empty:
-        st.error("This location is already assigned to another staff member for this time slot!")
-        return False
+    These are the per-row checks import_shifts makes, for a single shift.
+    """
+    if int(staff_id) not in get_store().staff_registry():
+        return "Unknown staff member"
+    if location not in LOCATIONS:
+        return "Unknown location"
+    start, end = shift_minutes([shift_type])
+    if start[0] < 8 * 60 or end[0] > 17 * 60 or end[0] <= start[0]:
+        return "Shift must be a time range between 08:00 and 17:00"
+    return None
+
+@timed
+def add_shift(staff_id, date, shift_type, location, on_conflict=st.error):
+    """Add a new shift to the shifts.csv file.
+
+    If it fails validate_shift or overlaps an existing shift, on_conflict is
+    called with the message and nothing is written.
+    """
+    store = get_store()
 
-    # Get correct staff ID from name
-    staff_df = pd.read_csv('data/staff.csv')
-    correct_staff_id = staff_df[staff_df['id'] == staff_id]['id'].iloc[0]
-    
-    # Add new shift
+    date_str = date.strftime('%Y-%m-%d')
     new_shift = pd.DataFrame([{
         'date': date_str,
-        'staff_id': correct_staff_id,
+        'staff_id': int(staff_id),
         'shift_type': shift_type,
         'location': location
     }])
-    shifts_df = pd.concat([shifts_df, new_shift], ignore_index=True)
-    shifts_df.to_csv('data/shifts.csv', index=False)
+    conflicts = []
+
+    def plan():
+        # Validate, then check for staff and location overlaps against the day's shifts
+        conflicts[:] = [
+            validate_shift(staff_id, shift_type, location)
+            or find_conflicts(new_shift, store.shifts_frame([date_str], minutes=True))[0]
+        ]
+        if conflicts[0]:
+            return None
+        return Change(add=[(date_str, staff_id, shift_type, location)])
+
+    if not store.apply(plan):
+        on_conflict(conflicts[0])
+        return False
+    invalidate_cache()
     return True
 
+@timed
 def export_schedule(week_dates):
     """Export the schedule for the given week to a CSV file."""
-    staff_df = pd.read_csv('data/staff.csv')
-    shifts_df = pd.read_csv('data/shifts.csv')
-
-    # Create export dataframe
-    export_data = []
-    for staff in staff_df.itertuples():
-        row = {'Staff Name': staff.name, 'Role': staff.role}
-        for date in week_dates:
-            date_str = date.strftime('%Y-%m-%d')
-            shift = shifts_df[(shifts_df['staff_id'] == staff.id) & 
-                            (shifts_df['date'] == date_str)]
-            if not shift.empty:
-                row[date_str] = f"{shift['shift_type'].iloc[0]} ({shift['location'].iloc[0]})"
-            else:
-                row[date_str] = "Off"
-        export_data.append(row)
-
-    export_df = pd.DataFrame(export_data)
-    export_filename = f"schedule_export_{week_dates[0].strftime('%Y%m%d')}.csv"
-    export_df.to_csv(export_filename, index=False)
+    return export_range(week_dates[0], week_dates[-1], dates=week_dates)
+
+@timed
+def export_range(start_date, end_date, file_format='csv', dates=None, path=None):
+    """Export every staff member's shifts from start_date to end_date to a CSV or xlsx file.
+
+    The table is built per chunk of staff and streamed to disk, so a year for
+    hundreds of staff never has to sit in memory as one frame. The file is
+    written to path if given, else under the export file name in the working
+    directory. Returns the export file name.
+    """
+    store = get_store()
+    if dates is None:
+        dates = pd.date_range(start_date, end_date).to_pydatetime()
+    date_strs = [date.strftime('%Y-%m-%d') for date in dates]
+    chunks = export_chunks(store.shifts_frame(date_strs, minutes=True), store.staff_frame(),
+                           date_strs)
+    export_filename = f"schedule_export_{start_date.strftime('%Y%m%d')}"
+    if len(date_strs) > 7:
+        export_filename += f"_{end_date.strftime('%Y%m%d')}"
+    if file_format == 'xlsx':
+        export_filename += '.xlsx'
+        write_xlsx(chunks, path or export_filename)
+    else:
+        export_filename += '.csv'
+        write_csv(chunks, path or export_filename)
+    return export_filename
+
+@timed
 def remove_shift(staff_id, date, location):
     """Remove a shift for a specific staff member on a specific date and location."""
-    shifts_df = pd.read_csv('data/shifts.csv')
-    shifts_df = shifts_df[~((shifts_df['staff_id'] == staff_id) & 
-                           (shifts_df['date'] == date) &
-                           (shifts_df['location'] == location))]
-    shifts_df.to_csv('data/shifts.csv', index=False)
+    get_store().remove_where(date=date, staff_id=staff_id, location=location)
+    invalidate_cache()
+
+@timed
+def remove_shifts(shifts_df):
+    """Remove every shift in shifts_df (date, staff_id, shift_type, location) in a single write."""
+    columns = ['date', 'staff_id', 'shift_type', 'location']
+    records = shifts_df[columns].itertuples(index=False, name=None)
+    if get_store().remove_shifts(records):
+        invalidate_cache()
 
+@timed
 def copy_day_shifts(source_date, target_date):
     """Copy all shifts from source date to target date."""
-    shifts_df = pd.read_csv('data/shifts.csv')
-    source_date_str = source_date.strftime('%Y-%m-%d')
-    target_date_str = target_date.strftime('%Y-%m-%d')
-    
-    # Get shifts for source date
-    source_shifts = shifts_df[shifts_df['date'] == source_date_str].copy()
-    
-    if not source_shifts.empty:
-        # Update the date for the new shifts
-        source_shifts['date'] = target_date_str
-        
-        # Remove any existing shifts in the target date
-        shifts_df = shifts_df[shifts_df['date'] != target_date_str]
-        
-        # Add the copied shifts
-        shifts_df = pd.concat([shifts_df, source_shifts], ignore_index=True)
-        shifts_df.to_csv('data/shifts.csv', index=False)
-        return True
-    return False
+    return rollout_shifts(source_date, source_date, [target_date]) > 0
 
+@timed
 def copy_week_shifts(source_monday, target_monday):
     """Copy all shifts from source week to target week."""
-    shifts_df = pd.read_csv('data/shifts.csv')
-    success = False
-    
-    for i in range(7):
-        source_date = source_monday + timedelta(days=i)
-        target_date = target_monday + timedelta(days=i)
-        source_date_str = source_date.strftime('%Y-%m-%d')
-        target_date_str = target_date.strftime('%Y-%m-%d')
-        
-        # Get shifts for source date
-        source_shifts = shifts_df[shifts_df['date'] == source_date_str].copy()
-        
-        if not source_shifts.empty:
-            # Update the date for the new shifts
-            source_shifts['date'] = target_date_str
-            
-            # Remove any existing shifts in the target date
-            shifts_df = shifts_df[shifts_df['date'] != target_date_str]
-            
-            # Add the copied shifts
-            shifts_df = pd.concat([shifts_df, source_shifts], ignore_index=True)
-            success = True
-    
-    if success:
-        shifts_df.to_csv('data/shifts.csv', index=False)
-    return success
+    return rollout_shifts(source_monday, source_monday + timedelta(days=6), [target_monday]) > 0
 
+@timed
 def copy_staff_shifts(staff_id, source_date, target_date):
     """Copy all shifts for a specific staff member from source date to target date."""
-    shifts_df = pd.read_csv('data/shifts.csv')
-    source_date_str = source_date.strftime('%Y-%m-%d')
-    target_date_str = target_date.strftime('%Y-%m-%d')
-    
-    # Get shifts for source date and staff member
-    source_shifts = shifts_df[(shifts_df['date'] == source_date_str) & 
-                            (shifts_df['staff_id'] == staff_id)].copy()
-    
-    if not source_shifts.empty:
-        # Update the date for the new shifts
-        source_shifts['date'] = target_date_str
-        
-        # Remove any existing shifts for that staff member on target date
-        shifts_df = shifts_df[~((shifts_df['date'] == target_date_str) & 
-                              (shifts_df['staff_id'] == staff_id))]
-        
-        # Add the copied shifts
-        shifts_df = pd.concat([shifts_df, source_shifts], ignore_index=True)
-        shifts_df.to_csv('data/shifts.csv', index=False)
-        return True
-    return False
+    return rollout_shifts(source_date, source_date, [target_date], staff_id=staff_id) > 0
+
+@timed
+def recurring_dates(source_start, until, every_weeks=1):
+    """Return the dates every_weeks weeks apart after source_start, up to and including until."""
+    step = timedelta(weeks=every_weeks)
+    start, until = pd.Timestamp(source_start).normalize(), pd.Timestamp(until).normalize()
+    return pd.date_range(start + step, until, freq=step).to_pydatetime().tolist()
+
+@timed
+def rollout_shifts(source_start, source_end, target_starts, staff_id=None):
+    """Copy the shifts from source_start..source_end onto each target start date in one write.
+
+    The source can be a day, a week or any other range, optionally limited
+    to one staff member, and target_starts can be any list of dates such as
+    recurring_dates(...). As with the copy buttons, each target day that
+    receives copies first loses its existing shifts (only that staff
+    member's, when staff_id is given). Returns the number of shifts written.
+    """
+    store = get_store()
+    span = (source_end - source_start).days + 1
+    source_dates = [(source_start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(span)]
+    target_starts = pd.to_datetime(pd.Series(target_starts)).dt.normalize().to_numpy()
+    written = []
+
+    def plan():
+        source = store.shifts_frame(source_dates)
+        if staff_id is not None:
+            source = source[source['staff_id'] == int(staff_id)]
+        if source.empty or len(target_starts) == 0:
+            return None
+
+        # Every (target, source shift) pair at once: target start + the shift's day offset
+        source_days = pd.to_datetime(source['date'].astype(str))
+        offsets = (source_days - pd.Timestamp(source_start).normalize()).to_numpy()
+        new_dates = (target_starts[:, None] + offsets[None, :]).ravel()
+        copies = pd.DataFrame({
+            'date': pd.DatetimeIndex(new_dates).strftime('%Y-%m-%d'),
+            'staff_id': np.tile(source['staff_id'].to_numpy(), len(target_starts)),
+            'shift_type': np.tile(source['shift_type'].to_numpy(), len(target_starts)),
+            'location': np.tile(source['location'].to_numpy(), len(target_starts)),
+        }).drop_duplicates()
+
+        # Clear the target days that receive copies
+        removed = [
+            row_id for date_str in copies['date'].unique()
+            for row_id in store.find(date=date_str, staff_id=staff_id)
+        ]
+        written[:] = [len(copies)]
+        return Change(remove=removed, add=list(copies.itertuples(index=False, name=None)))
+
+    if not store.apply(plan):
+        return 0
+    invalidate_cache()
+    return written[0]
+
+@timed
+def load_availability():
+    """Return the saved staff hours as a frame of staff_id, day and hours (blank for a day off)."""
+    if not os.path.exists(AVAILABILITY_FILE):
+        return pd.DataFrame(columns=['staff_id', 'day', 'hours'])
+    return pd.read_csv(AVAILABILITY_FILE, dtype=str, keep_default_na=False)
+
+@timed
+def import_availability(source):
+    """Save the staff hours in an xlsx roster's day headers as dated rows of the availability file.
+
+    Rows replace any saved hours for the same staff member and date; names
+    that do not match exactly one staff member are skipped. Returns the
+    number of rows saved.
+    """
+    if isinstance(source, pd.DataFrame):
+        return 0
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    found = read_staff_hours(source)
+    found['staff_id'] = found['staff'].map(load_registry().id_of)
+    found = found.dropna(subset=['staff_id'])
+    rows = pd.DataFrame({
+        'staff_id': found['staff_id'].astype(int).astype(str),
+        'day': found['date'],
+        'hours': found['hours'].fillna(''),
+    })
+    if rows.empty:
+        return 0
+    with file_lock(os.path.join(os.path.dirname(AVAILABILITY_FILE), '.availability.lock')):
+        saved = load_availability()
+        replaced = pd.MultiIndex.from_frame(saved[['staff_id', 'day']]).isin(
+            pd.MultiIndex.from_frame(rows[['staff_id', 'day']]))
+        atomic_write_csv(pd.concat([saved[~replaced], rows], ignore_index=True), AVAILABILITY_FILE)
+    return len(rows)
+
+@timed
+def load_location_roles():
+    """Return the {location: [roles]} limits for auto_schedule; unlisted locations take anyone."""
+    if not os.path.exists(LOCATION_ROLES_FILE):
+        return {}
+    return read_location_roles(pd.read_csv(LOCATION_ROLES_FILE, dtype=str))
+
+@timed
+def save_location_roles(location_roles):
+    """Save a {location: [roles]} mapping as the auto_schedule role limits."""
+    rows = [(location, role) for location, roles in location_roles.items() for role in roles]
+    atomic_write_csv(pd.DataFrame(rows, columns=['location', 'role']), LOCATION_ROLES_FILE)
+
+@timed
+def auto_schedule(monday, availability=None, settings=None):
+    """Fill the week starting at monday with solver shifts around the existing ones.
+
+    availability and settings default to the saved staff hours and
+    location role limits. Existing shifts are kept; the solver's shifts are
+    checked for conflicts again inside the write and added in one batch.
+    Returns the number of shifts added and the minutes of required coverage
+    left unfilled.
+    """
+    if availability is None:
+        availability = read_availability(load_availability())
+    if settings is None:
+        settings = SolverSettings(location_roles=load_location_roles())
+    store = get_store()
+    date_strs = [date.strftime('%Y-%m-%d') for date in get_week_dates(monday)]
+    result = []
+
+    def plan():
+        existing = store.shifts_frame(date_strs, minutes=True)
+        shifts_df, uncovered = solve_week(get_week_dates(monday), store.staff_frame(), existing,
+                                          availability, settings)
+        conflicts = find_conflicts(shifts_df, existing, settings.exclusive_locations)
+        shifts_df = shifts_df[conflicts.isna().to_numpy()]
+        result[:] = [len(shifts_df), uncovered]
+        if shifts_df.empty:
+            return None
+        return Change(add=list(shifts_df.itertuples(index=False, name=None)))
+
+    if store.apply(plan):
+        invalidate_cache()
+    return result[0], result[1]
+
+@timed
+def coverage_gaps(start_date, end_date):
+    """Return the uncovered location time slots between start_date and end_date."""
+    dates = pd.date_range(start_date, end_date).strftime('%Y-%m-%d').tolist()
+    return get_coverage().gaps(dates)
+
+@timed
+def staff_hours(start_date, end_date):
+    """Return a staff x week table of hours worked between start_date and end_date."""
+    dates = pd.date_range(start_date, end_date).strftime('%Y-%m-%d').tolist()
+    hours_df = get_coverage().hours(dates)
+    staff_df = load_staff()
+    table = hours_df.pivot(index='staff_id', columns='week', values='hours')
+    table = table.reindex(index=staff_df['id']).fillna(0)
+    table.insert(0, 'Staff Name', staff_df['name'].to_numpy())
+    table['Total'] = table.drop(columns='Staff Name').sum(axis=1)
+    table.columns.name = None
+    return table.round(2).reset_index(drop=True)
+
+@timed
+def import_shifts(source):
+    """Import shifts from a DataFrame or xlsx roster in a single batched write.
+
+    Every row is validated before anything is written: unknown staff or
+    locations, bad times and conflicts with existing or earlier imported
+    shifts are all collected. The accepted rows are then added in one write.
+    Returns the number of imported shifts and a DataFrame of rejected rows
+    with a 'reason' column.
+    """
+    store = get_store()
+    candidates = read_shifts(source).reset_index(drop=True)
+
+    # Resolve staff names to ids and locations to their canonical spelling
+    registry = store.staff_registry()
+    names = candidates['staff'].fillna('').astype(str)
+    by_name = names.map(registry.id_of).astype(float)
+    candidates['staff_id'] = pd.to_numeric(candidates['staff_id'], errors='coerce').fillna(by_name)
+    shared_name = (candidates['reason'].isna() & candidates['staff_id'].isna()
+                   & (names.map(lambda name: len(registry.ids_of(name))) > 1))
+    candidates.loc[shared_name, 'reason'] = "Several staff members have this name; give a staff_id"
+    known_staff = candidates['staff_id'].isin(registry.ids.tolist())
+    unknown_staff = candidates['reason'].isna() & ~known_staff
+    candidates.loc[unknown_staff, 'reason'] = "Unknown staff member"
+
+    locations_by_key = {location.lower(): location for location in LOCATIONS}
+    canonical = candidates['location'].str.lower().map(locations_by_key)
+    unknown_location = candidates['reason'].isna() & canonical.isna()
+    candidates.loc[unknown_location, 'reason'] = "Unknown location"
+    candidates['location'] = canonical.fillna(candidates['location'])
+
+    # Check the times against the same window as the Add Shift form
+    start, end = shift_minutes(candidates['shift_type'])
+    bad_time = candidates['reason'].isna() & ((start < 8 * 60) | (end > 17 * 60) | (end <= start))
+    candidates.loc[bad_time, 'reason'] = "Shift must be a time range between 08:00 and 17:00"
+
+    valid = candidates[candidates['reason'].isna()].copy()
+    valid['staff_id'] = valid['staff_id'].astype(int)
+
+    def plan():
+        # Conflicts are checked as part of the write so a retry sees concurrent changes
+        existing = store.shifts_frame(valid['date'].unique().tolist(), minutes=True)
+        candidates.loc[valid.index, 'reason'] = find_conflicts(valid, existing).to_numpy()
+        accepted = candidates[candidates['reason'].isna()]
+        if accepted.empty:
+            return None
+        return Change(add=list(accepted[['date', 'staff_id', 'shift_type', 'location']]
+                               .itertuples(index=False, name=None)))
+
+    if store.apply(plan):
+        invalidate_cache()
+    rejected = candidates[candidates['reason'].notna()].reset_index(drop=True)
+    return len(candidates) - len(rejected), rejected